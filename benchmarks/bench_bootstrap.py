@@ -0,0 +1,67 @@
+# This work developed by NOAA/NWS/EMC under the Apache 2.0 license.
+'''
+Compare the list based bootstrap that emcpy originally shipped with the
+block based engine in `emcpy.stats.bootstrap`.
+
+Usage:
+    python benchmarks/bench_bootstrap.py [--nrepl 100] [--estimator mean]
+
+The legacy implementation materializes all `nrepl x n` resamples at once,
+so it is skipped when that would need more than `--legacy-max-gb`.
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from emcpy.stats import bootstrap
+
+
+def bootstrap_legacy(sample, level=.95, estimator='mean', nrepl=10000):
+    boot_dist = [np.random.choice(sample, np.size(sample)) for x in np.arange(nrepl)]
+    if estimator == 'mean':
+        deltas = np.sort(np.mean(boot_dist, axis=1) - np.mean(sample))
+    else:
+        deltas = np.sort(np.median(boot_dist, axis=1) - np.median(sample))
+
+    lower_pctile = 100*((1. - level)/2.)
+    upper_pctile = 100. - lower_pctile
+
+    return np.percentile(deltas, lower_pctile), np.percentile(deltas, upper_pctile)
+
+
+def _time(func, *args, **kwargs):
+    tic = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - tic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nrepl', type=int, default=100)
+    parser.add_argument('--estimator', default='mean', choices=['mean', 'median'])
+    parser.add_argument('--legacy-max-gb', type=float, default=1.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    print(f'{"n":>10} {"legacy (s)":>12} {"block (s)":>12} {"speedup":>8}')
+    for n in [10**4, 10**5, 10**6, 10**7]:
+        sample = rng.normal(size=n)
+
+        new = _time(bootstrap, sample, estimator=args.estimator,
+                    nrepl=args.nrepl, seed=0)
+
+        legacy_gb = 8. * n * args.nrepl / 1024**3
+        if legacy_gb <= args.legacy_max_gb:
+            old = _time(bootstrap_legacy, sample, estimator=args.estimator,
+                        nrepl=args.nrepl)
+            print(f'{n:>10d} {old:>12.3f} {new:>12.3f} {old/new:>8.1f}')
+        else:
+            print(f'{n:>10d} {"skipped":>12} {new:>12.3f} {"-":>8}')
+
+
+if __name__ == '__main__':
+    main()
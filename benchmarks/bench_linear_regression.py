@@ -0,0 +1,76 @@
+# This work developed by NOAA/NWS/EMC under the Apache 2.0 license.
+'''
+Compare the scikit-learn based linear regression that emcpy originally
+shipped with the closed form `emcpy.stats.get_linear_regression`.
+
+Usage:
+    python benchmarks/bench_linear_regression.py [--channels 20]
+
+scikit-learn is only needed for the comparison column.
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from emcpy.stats import get_linear_regression
+
+
+def linear_regression_sklearn(x, y):
+    from sklearn.linear_model import LinearRegression
+
+    x = x.reshape((-1, 1))
+    model = LinearRegression().fit(x, y)
+    r_sq = model.score(x, y)
+    y_pred = model.predict(x)
+
+    return y_pred, r_sq, model.intercept_, model.coef_[0]
+
+
+def _time(func, *args):
+    tic = time.perf_counter()
+    out = func(*args)
+    return time.perf_counter() - tic, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--channels', type=int, default=20,
+                        help='number of channels for the batched comparison')
+    args = parser.parse_args()
+
+    try:
+        import sklearn  # noqa: F401
+        have_sklearn = True
+    except ImportError:
+        have_sklearn = False
+
+    rng = np.random.default_rng(0)
+
+    print(f'{"n":>10} {"sklearn (s)":>12} {"numpy (s)":>12} {"speedup":>8}')
+    for n in [10**4, 10**5, 10**6, 10**7]:
+        x = rng.normal(loc=250., size=n)
+        y = 0.8 * x + rng.normal(size=n)
+
+        new, (_, r_sq, intercept, slope) = _time(get_linear_regression, x, y)
+        if have_sklearn:
+            old, ref = _time(linear_regression_sklearn, x, y)
+            assert np.allclose([r_sq, intercept, slope], ref[1:])
+            print(f'{n:>10d} {old:>12.3f} {new:>12.3f} {old/new:>8.1f}')
+        else:
+            print(f'{n:>10d} {"-":>12} {new:>12.3f} {"-":>8}')
+
+    # one batched call versus a loop of per-channel fits
+    n = 10**5
+    x = rng.normal(loc=250., size=(n, args.channels))
+    y = 0.8 * x + rng.normal(size=(n, args.channels))
+    batched, _ = _time(get_linear_regression, x, y)
+    loop, _ = _time(lambda: [get_linear_regression(x[:, i], y[:, i]) for i in range(args.channels)])
+    print(f'\n{args.channels} channels x {n} obs: batched {batched:.3f} s, '
+          f'per channel loop {loop:.3f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -32,7 +32,7 @@ setuptools.setup(
         'netCDF4>=1.5.3',
         'matplotlib>=3.5.2',
         'cartopy>=0.20.2',
-        'scikit-learn>=1.0.2',
+        'shapely>=1.7',
         'xarray>=0.11.3',
     ]
 )
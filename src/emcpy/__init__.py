@@ -4,10 +4,21 @@
 __docformat__ = "restructuredtext"
 
 import os
-import emcpy.calcs
-import emcpy.utils
-import emcpy.stats
-import emcpy.io.netCDF
-import emcpy.plots
+import importlib as _importlib
 
 emcpy_directory = os.path.dirname(__file__)
+
+# Subpackages are imported on first access (PEP 562) so that e.g.
+# `from emcpy.calcs.units import K_to_C` does not pay for matplotlib,
+# cartopy, scipy or netCDF4.
+_submodules = ['calcs', 'utils', 'stats', 'io', 'plots']
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return _importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + _submodules)
@@ -0,0 +1,10 @@
+import importlib as _importlib
+
+_submodules = ['netCDF']
+
+
+def __getattr__(name):
+    # import netCDF4 only when emcpy.io.netCDF is first used
+    if name in _submodules:
+        return _importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
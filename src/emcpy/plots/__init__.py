@@ -1,2 +1,25 @@
-from .create_plots import CreateFigure, CreatePlot
-from .variable_specs import VariableSpecs
+import importlib as _importlib
+
+# import matplotlib based modules on first use so that lightweight
+# helpers such as emcpy.plots.map_tools can be used on their own
+_attributes = {
+    'CreateFigure': 'create_plots',
+    'CreatePlot': 'create_plots',
+    'VariableSpecs': 'variable_specs',
+    'render_many': 'batch',
+    'RenderResult': 'batch'
+}
+
+
+def __getattr__(name):
+    if name in _attributes:
+        module = _importlib.import_module(f'{__name__}.{_attributes[name]}')
+        return getattr(module, name)
+    # submodules, e.g. emcpy.plots.map_tools, are imported on first access
+    if not name.startswith('_'):
+        try:
+            return _importlib.import_module(f'{__name__}.{name}')
+        except ModuleNotFoundError as err:
+            if err.name != f'{__name__}.{name}':
+                raise
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
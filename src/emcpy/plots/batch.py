@@ -0,0 +1,142 @@
+# This work developed by NOAA/NWS/EMC under the Apache 2.0 license.
+import os
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+__all__ = ['render_many', 'RenderResult']
+
+# outcome of rendering one figure; error is None or the formatted traceback
+RenderResult = namedtuple('RenderResult', ['index', 'path', 'seconds', 'error'])
+
+
+def render_many(figures, workers=None, prewarm=['coastline'],
+                max_pending=None, feature_store=None, **kwargs):
+    """
+    Render and save many figures in a pool of worker processes using
+    the Agg backend. Results are yielded as soon as each figure is
+    written, and a figure that fails is reported without stopping the
+    rest of the batch.
+
+    Args:
+        figures : (iterable) (CreateFigure, path) pairs to create and
+                  save. A figure may also be given as a spec from
+                  emcpy.plots.specs.figure_to_dict, which is much cheaper
+                  to send to workers than a figure holding its arrays.
+                  The iterable is consumed lazily, so it may be a
+                  generator building figures on the fly.
+        workers : (int; default=None) number of worker processes;
+                  None uses all available CPUs and 1 renders in the
+                  current process
+        prewarm : (list; default=['coastline']) map features loaded once
+                  in each worker before rendering (see
+                  CreatePlot.add_map_features), as names for the 110m
+                  scale or (name, scale) pairs, e.g. ('states', '10m')
+                  for zoomed maps; None or [] to skip
+        max_pending : (int; default=None) maximum number of figures
+                      submitted but not done, bounding the memory used
+                      by queued figures; defaults to 2 * workers
+        feature_store : (bool or str; default=None) the feature_store of
+                        the figures (see CreateFigure), so the prewarmed
+                        features are the ones the figures read; None
+                        prewarms the cartopy features
+        **kwargs : passed to CreateFigure.save_figure
+    Returns:
+        A generator of RenderResult(index, path, seconds, error) in the
+        order figures complete; index is the position of the figure in
+        `figures`.
+    """
+    if workers is None:
+        workers = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+
+    if workers <= 1:
+        for index, (figure, path) in enumerate(figures):
+            yield _render(index, figure, path, kwargs)
+        return
+
+    max_pending = 2 * workers if max_pending is None else max(max_pending, 1)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(prewarm, feature_store)) as executor:
+        # index and path of each pending figure, to report failed submissions
+        pending = {}
+        for index, (figure, path) in enumerate(figures):
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from _results(done, pending)
+            pending[executor.submit(_render, index, figure, path, kwargs)] = (index, path)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from _results(done, pending)
+
+
+def _results(futures, pending):
+    """
+    Results of finished futures, removed from pending. _render never
+    raises, so an exception here means the figure could not be sent
+    to or run in the worker.
+    """
+    for future in futures:
+        index, path = pending.pop(future)
+        try:
+            yield future.result()
+        except Exception:
+            yield RenderResult(index, path, 0., traceback.format_exc())
+
+
+def _init_worker(prewarm, feature_store=None):
+    """
+    Set up a worker: select the Agg backend and load the map features
+    used by most figures once, instead of once per figure, through the
+    same path CreateFigure draws them with.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+    if not prewarm:
+        return
+
+    import cartopy.feature as cfeature
+    from emcpy.plots.features import FeatureStore
+
+    if feature_store is not None:
+        store = FeatureStore(data_dir=None if feature_store is True else feature_store)
+
+    for item in prewarm:
+        name, scale = (item, '110m') if isinstance(item, str) else item
+        try:
+            if feature_store is not None:
+                # shapefiles are read once per process by all stores
+                store.load(name, scale)
+            else:
+                # geometries are read from the Natural Earth files on first use
+                for _ in getattr(cfeature, name.upper()).with_scale(scale).geometries():
+                    pass
+        except Exception:
+            # a missing feature fails the figures that use it, not the worker
+            pass
+
+
+def _render(index, figure, path, kwargs):
+    """
+    Create and save one figure, timing it and capturing any error.
+    """
+    import matplotlib.pyplot as plt
+    from emcpy.plots.specs import figure_from_dict
+
+    tic = time.perf_counter()
+    error = None
+    try:
+        if isinstance(figure, dict):
+            figure = figure_from_dict(figure)
+        figure.create_figure()
+        figure.save_figure(path, **kwargs)
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        if hasattr(figure, 'fig'):
+            plt.close(figure.fig)
+
+    return RenderResult(index, path, time.perf_counter() - tic, error)
@@ -5,20 +5,22 @@ import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
-from PIL import Image
-from scipy.interpolate import interpn
-from cartopy.mpl.ticker import LongitudeFormatter, LatitudeFormatter
 from matplotlib.offsetbox import OffsetImage, AnchoredOffsetbox
 from matplotlib.ticker import MultipleLocator, NullFormatter, ScalarFormatter
 from matplotlib.projections import register_projection
-from emcpy.plots.map_tools import Domain, MapProjection
+from emcpy.plots.map_tools import Domain, MapProjection, ProjectionCache, RasterRemap, \
+    superob, crop_grid, crop_points
 from emcpy.plots.skewt_projection import SkewXAxes
+from emcpy.plots.templates import MapTemplateCache
+from emcpy.plots.features import FeatureStore, feature_scale
 from emcpy.stats.stats import get_linear_regression
+from emcpy.stats.accumulators import bin_index
 
 __all__ = ['CreateFigure', 'CreatePlot']
 
+# pixel to grid point mappings shared by all figures
+_raster_remap = RasterRemap()
+
 
 class CreatePlot:
     """
@@ -128,9 +130,28 @@ class CreatePlot:
             **kwargs
         }
 
-    def add_map_features(self, feature_list=['coastline']):
-
-        self.map_features = feature_list
+    def add_map_features(self, feature_list=['coastline'], scale='auto',
+                         tolerance='auto'):
+        """
+        Args:
+            feature_list : (list; default=['coastline']) map features
+            scale : (str; default='auto') Natural Earth scale '110m', '50m'
+                    or '10m'; 'auto' picks it from the size of a pixel
+                    of the map, see features.feature_scale
+            tolerance : (float or str; default='auto') simplification
+                        tolerance of the geometries in pixels of the map;
+                        'auto' is half a pixel and 0 keeps every vertex
+        """
+        scales = ['auto', '110m', '50m', '10m']
+        if scale not in scales:
+            raise ValueError(f'{scale} is not a valid map feature scale. ' +
+                             f'Valid scales are: {" | ".join(scales)}')
+
+        self.map_features = {
+            'features': feature_list,
+            'scale': scale,
+            'tolerance': tolerance
+        }
 
     def set_xlim(self, left=None, right=None):
 
@@ -176,11 +197,11 @@ class CreatePlot:
 
     def invert_xaxis(self):
 
-        self.invert_xaxis = True
+        self.xaxis_inverted = True
 
     def invert_yaxis(self):
 
-        self.invert_yaxis = True
+        self.yaxis_inverted = True
 
     def set_xscale(self, scale):
 
@@ -203,8 +224,38 @@ class CreatePlot:
 class CreateFigure:
 
     def __init__(self, nrows=1, ncols=1, figsize=(8, 6),
-                 sharex=False, sharey=False):
-
+                 sharex=False, sharey=False, projection_cache=None,
+                 crop_to_domain=True, map_templates=None, feature_store=None):
+        """
+        Args:
+            nrows : (int; default=1) number of rows of subplots
+            ncols : (int; default=1) number of columns of subplots
+            figsize : (tuple; default=(8, 6)) figure size in inches
+            sharex : (bool; default=False) share x axes
+            sharey : (bool; default=False) share y axes
+            projection_cache : (ProjectionCache, bool or str; default=None)
+                               cache of map coordinates projected to the
+                               map projection, shared between figures. True
+                               creates an in-memory cache and a string a
+                               cache stored in that directory.
+            crop_to_domain : (bool; default=True) crop map layers to the
+                             domain extent plus a halo before drawing
+            map_templates : (MapTemplateCache, bool or str; default=None)
+                            cache of map feature backgrounds shared between
+                            figures, so the features of a projection, domain
+                            and figure size are drawn once and overlaid as an
+                            image afterwards. True creates an in-memory cache
+                            and a string a cache stored in that directory.
+                            Images are redrawn at the dpi of save_figure;
+                            vector formats (pdf, svg, eps, ps) draw the
+                            features as vectors instead.
+            feature_store : (FeatureStore, bool or str; default=None)
+                            store of map feature geometries read from local
+                            Natural Earth files and clipped to the domain,
+                            instead of the cartopy features. True uses the
+                            cartopy data directories and a string the
+                            shapefiles in that directory.
+        """
         self.nrows = nrows
         self.ncols = ncols
         self.figsize = figsize
@@ -212,6 +263,26 @@ class CreateFigure:
         self.sharey = sharey
         self.plot_list = []
 
+        if projection_cache is True:
+            projection_cache = ProjectionCache()
+        elif isinstance(projection_cache, (str, os.PathLike)):
+            projection_cache = ProjectionCache(cache_dir=projection_cache)
+        self.projection_cache = projection_cache or None
+        self.crop_to_domain = crop_to_domain
+        if map_templates is True:
+            map_templates = MapTemplateCache()
+        elif isinstance(map_templates, (str, os.PathLike)):
+            map_templates = MapTemplateCache(cache_dir=map_templates)
+        self.map_templates = map_templates or None
+        # (ax, image, features, zorder, dpi) of the drawn map templates
+        self.template_layers = []
+        if feature_store is True:
+            feature_store = FeatureStore()
+        elif isinstance(feature_store, (str, os.PathLike)):
+            feature_store = FeatureStore(data_dir=feature_store)
+        self.feature_store = feature_store or None
+        self.crop_extent = None
+
     def save_figure(self, pathfile, **kwargs):
         """
         Method to save figure to file
@@ -228,6 +299,12 @@ class CreateFigure:
         if 'tight_layout' in kwargs:
             del kwargs['tight_layout']
 
+        if self.template_layers:
+            fmt = kwargs.get('format') or os.path.splitext(file)[1][1:] or \
+                matplotlib.rcParams['savefig.format']
+            dpi = kwargs.get('dpi', matplotlib.rcParams['savefig.dpi'])
+            self._redraw_templates(fmt.lower(), self.fig.dpi if dpi == 'figure' else dpi)
+
         # Save figure
         self.fig.savefig(pathfile, **kwargs)
 
@@ -277,11 +354,17 @@ class CreateFigure:
 
         gs = gridspec.GridSpec(self.nrows, self.ncols)
         self.fig = plt.figure(figsize=self.figsize)
+        self.template_layers = []
 
         for i, plot_obj in enumerate(self.plot_list):
 
+            self.crop_extent = None
+
             # check if object has projection and domain attributes to determine ax
             if hasattr(plot_obj, 'projection'):
+                import cartopy.crs as ccrs
+                from cartopy.mpl.ticker import LongitudeFormatter, LatitudeFormatter
+
                 # Check if domain object is tuple/list for custom domains
                 if isinstance(plot_obj.domain, (tuple, list)):
                     self.domain = Domain(domain=plot_obj.domain[0], dd=plot_obj.domain[1])
@@ -294,6 +377,9 @@ class CreateFigure:
                 ax = plt.subplot(gs[i], projection=self.projection.projection)
                 if str(self.projection) not in ['npstere', 'spstere']:
                     ax.set_extent(self.domain.extent)
+                    # crop layers given in lat/lon to the domain
+                    if self.crop_to_domain and self.projection.transform == ccrs.PlateCarree():
+                        self.crop_extent = self.domain.extent
                     if str(self.projection) not in ['lamconf']:
                         ax.set_xticks(self.domain.xticks, crs=ccrs.PlateCarree())
                         ax.set_yticks(self.domain.yticks, crs=ccrs.PlateCarree())
@@ -343,6 +429,8 @@ class CreateFigure:
             'noaa/nws': 'noaa_nws_logo_150x75.png'
         }
 
+        from PIL import Image
+
         image_path = os.path.join(emcpy.emcpy_directory, 'logos', image_dict[which])
         im = Image.open(image_path)
 
@@ -407,6 +495,9 @@ class CreateFigure:
             'yticks': self._set_yticks,
             'xticklabels': self._set_xticklabels,
             'yticklabels': self._set_yticklabels,
+            'xaxis_inverted': self._invert_xaxis,
+            'yaxis_inverted': self._invert_yaxis,
+            # attributes set by older versions of invert_xaxis/invert_yaxis
             'invert_xaxis': self._invert_xaxis,
             'invert_yaxis': self._invert_yaxis,
             'xscale': self._set_xscale,
@@ -424,17 +515,43 @@ class CreateFigure:
         if 'integer_field' in vars(plotobj):
             integer_field = True
 
+        latitude, longitude, data = plotobj.latitude, plotobj.longitude, plotobj.data
+        markersize = plotobj.markersize
+        keep = None
+        if self.crop_extent is not None:
+            keep = crop_points(latitude, longitude, self.crop_extent)
+        if keep is not None:
+            keep = keep.ravel()
+            # keep the mask of masked arrays (e.g. fill values from netCDF)
+            latitude = np.ma.ravel(latitude)[keep]
+            longitude = np.ma.ravel(longitude)[keep]
+            data = None if data is None else np.ma.ravel(data)[keep]
+            if np.size(markersize) == keep.size:
+                markersize = np.asarray(markersize).ravel()[keep]
+
+        if getattr(plotobj, 'thinning', None) is not None:
+            if np.ndim(plotobj.markersize) > 0:
+                raise ValueError('markersize must be a scalar for thinned MapScatter ' +
+                                 'layers, the thinned points do not match the sizes.')
+            resolution = plotobj.thinning['resolution']
+            if resolution == 'auto':
+                resolution = self._pixel_resolution(ax)
+            latitude, longitude, data = superob(latitude, longitude, data,
+                                                resolution=resolution,
+                                                method=plotobj.thinning['method'])
+
         if plotobj.data is None:
             skipvars = ['plottype', 'longitude', 'latitude',
-                        'markersize', 'integer_field', 'colorbar']
+                        'markersize', 'integer_field', 'colorbar', 'thinning']
             inputs = self._get_inputs_dict(skipvars, plotobj)
 
-            cs = ax.scatter(plotobj.longitude, plotobj.latitude,
-                            s=plotobj.markersize, **inputs,
-                            transform=self.projection.transform)
+            x, y, transform = self._project(longitude, latitude)
+            cs = ax.scatter(x, y, s=markersize, **inputs,
+                            transform=transform)
         else:
             skipvars = ['plottype', 'longitude', 'latitude',
-                        'data', 'markersize', 'colorbar', 'normalize', 'integer_field']
+                        'data', 'markersize', 'colorbar', 'normalize', 'integer_field',
+                        'thinning']
             inputs = self._get_inputs_dict(skipvars, plotobj)
 
             norm = None
@@ -447,49 +564,123 @@ class CreateFigure:
                     exit()
                 norm = matplotlib.colors.BoundaryNorm(np.arange(vmin-0.5, vmax, 1), cmap.N)
 
-            cs = ax.scatter(plotobj.longitude, plotobj.latitude,
-                            c=plotobj.data, s=plotobj.markersize,
-                            **inputs, norm=norm, transform=self.projection.transform)
+            x, y, transform = self._project(longitude, latitude)
+            cs = ax.scatter(x, y, c=data, s=markersize,
+                            **inputs, norm=norm, transform=transform)
 
         if plotobj.colorbar:
             self.cs = cs
 
+    def _project(self, longitude, latitude, finite=False):
+        """
+        Coordinates and transform used to draw map layers. With a
+        projection cache, coordinates are projected once through the
+        cache and drawn in the native map projection. If finite is
+        True (pcolormesh, contour) and some points fall outside of the
+        projection, the lat/lon coordinates are returned for cartopy
+        to handle.
+        """
+        if self.projection_cache is None:
+            return longitude, latitude, self.projection.transform
+
+        x, y = self.projection_cache.project(longitude, latitude,
+                                             self.projection.transform,
+                                             self.projection.projection)
+        if finite and not (np.isfinite(x).all() and np.isfinite(y).all()):
+            return longitude, latitude, self.projection.transform
+
+        return x, y, self.projection.projection
+
+    def _pixel_resolution(self, ax):
+        """
+        Size in degrees of one pixel of ax over the extent of the
+        current domain.
+        """
+        lon_min, lon_max, lat_min, lat_max = self.domain.extent
+        bbox = ax.get_window_extent()
+
+        return max((lon_max - lon_min) / bbox.width,
+                   (lat_max - lat_min) / bbox.height)
+
     def _map_gridded(self, plotobj, ax):
 
         skipvars = ['plottype', 'longitude', 'latitude', 'data',
-                    'markersize', 'colorbar']
+                    'markersize', 'colorbar', 'renderer']
         inputs = self._get_inputs_dict(skipvars, plotobj)
 
+        if getattr(plotobj, 'renderer', 'pcolormesh') == 'raster':
+            cs = self._map_raster(plotobj, ax, inputs)
+            if plotobj.colorbar:
+                self.cs = cs
+            return
+
         # Check for 3d data
         if plotobj.longitude.ndim == 3:
             # Get total number of tiles; assumes Nth dimension is tile
             tiles = plotobj.longitude.shape[-1]
-
-            # Loops through tiles to plot on one map
-            for i in range(tiles):
-                cs = ax.pcolormesh(plotobj.longitude[:, :, i],
-                                   plotobj.latitude[:, :, i],
-                                   plotobj.data[:, :, i], **inputs,
-                                   transform=self.projection.transform)
+            grids = [(plotobj.latitude[:, :, i], plotobj.longitude[:, :, i],
+                      plotobj.data[:, :, i]) for i in range(tiles)]
 
         # Else, plot regular 2D data
         else:
-            cs = ax.pcolormesh(plotobj.longitude, plotobj.latitude,
-                               plotobj.data, **inputs,
-                               transform=self.projection.transform)
-
-        if plotobj.colorbar:
+            grids = [(plotobj.latitude, plotobj.longitude, plotobj.data)]
+
+        # Skip tiles that are outside of the domain
+        grids = [grid for grid in (self._crop_grid(*grid) for grid in grids) if grid is not None]
+
+        # Tiles share one color scale, from the data when not given
+        if len(grids) > 1:
+            if inputs.get('vmin') is None:
+                inputs['vmin'] = min(np.nanmin(data) for _, _, data in grids)
+            if inputs.get('vmax') is None:
+                inputs['vmax'] = max(np.nanmax(data) for _, _, data in grids)
+
+        # Loops through tiles to plot on one map
+        cs = None
+        for latitude, longitude, data in grids:
+            x, y, transform = self._project(longitude, latitude, finite=True)
+            cs = ax.pcolormesh(x, y, data, **inputs,
+                               transform=transform)
+
+        if plotobj.colorbar and cs is not None:
             self.cs = cs
 
+    def _map_raster(self, plotobj, ax, inputs):
+        """
+        Draws a gridded layer, e.g. all six cubed-sphere tiles, as a
+        single image at the resolution of ax. Each pixel takes the value
+        of the nearest grid point; the pixel to grid point mapping is
+        cached so later fields on the same grid are one gather.
+        """
+        extent = ax.get_extent()
+        bbox = ax.get_window_extent()
+        shape = (max(int(np.ceil(bbox.height)), 1), max(int(np.ceil(bbox.width)), 1))
+
+        # the remapping cache is shared by the figures of the process and
+        # is not part of the (pickled) figure
+        idx = _raster_remap.indices(plotobj.longitude, plotobj.latitude,
+                                    ax.projection, extent, shape)
+
+        data = np.ma.filled(np.ma.asarray(plotobj.data, dtype=float), np.nan).ravel()
+        image = np.where(idx >= 0, data[np.maximum(idx, 0)], np.nan)
+
+        return ax.imshow(np.ma.masked_invalid(image), extent=extent, origin='lower',
+                         transform=ax.projection, interpolation='nearest', **inputs)
+
     def _map_contour(self, plotobj, ax):
 
         skipvars = ['plottype', 'longitude', 'latitude', 'data',
                     'markersize', 'colorbar']
         inputs = self._get_inputs_dict(skipvars, plotobj)
 
-        cs = ax.contour(plotobj.longitude, plotobj.latitude,
-                        plotobj.data, **inputs,
-                        transform=self.projection.transform)
+        grid = self._crop_grid(plotobj.latitude, plotobj.longitude, plotobj.data)
+        if grid is None:
+            return
+        latitude, longitude, data = grid
+
+        x, y, transform = self._project(longitude, latitude, finite=True)
+        cs = ax.contour(x, y, data, **inputs,
+                        transform=transform)
 
         if plotobj.clabel:
             plt.clabel(cs, levels=plotobj.levels, use_clabeltext=True)
@@ -497,38 +688,185 @@ class CreateFigure:
         if plotobj.colorbar:
             self.cs = cs
 
+    def _crop_grid(self, latitude, longitude, data):
+        """
+        Crop a gridded layer to the current domain when cropping is
+        enabled. Returns None if the grid is outside of the domain.
+        """
+        if self.crop_extent is None:
+            return latitude, longitude, data
+
+        return crop_grid(latitude, longitude, data, self.crop_extent)
+
     def _density_scatter(self, plotobj, ax):
         """
         Uses Scatter Object to plot density scatter colored by
         2d histogram.
         """
-        _idx = np.logical_and(~np.isnan(plotobj.x), ~np.isnan(plotobj.y))
-        data, x_e, y_e = np.histogram2d(plotobj.x[_idx], plotobj.y[_idx],
-                                        bins=plotobj.density['bins'],
-                                        density=not plotobj.density['nsamples'])
+        if plotobj.density.get('mode', 'scatter') == 'image':
+            self._density_image(plotobj, ax)
+            return
+
+        x = np.asarray(plotobj.x).ravel()
+        y = np.asarray(plotobj.y).ravel()
+        _idx = np.logical_and(~np.isnan(x), ~np.isnan(y))
+        if not _idx.all():
+            x, y = x[_idx], y[_idx]
+
+        counts, x_e, y_e, flat = self._histogram2d_index(x, y, plotobj.density['bins'])
         if plotobj.density['nsamples']:
             # compute percentage of total for each bin
-            data = data / np.count_nonzero(_idx) * 100.
-        z = interpn((0.5*(x_e[1:] + x_e[:-1]), 0.5*(y_e[1:]+y_e[:-1])),
-                    data, np.vstack([plotobj.x, plotobj.y]).T,
-                    method=plotobj.density['interp'], bounds_error=False)
-        # To be sure to plot all data
-        z[np.where(np.isnan(z))] = 0.0
+            data = counts / max(x.size, 1) * 100.
+        else:
+            data = counts / (max(counts.sum(), 1.) * np.outer(np.diff(x_e), np.diff(y_e)))
+
+        if plotobj.density['interp'] == 'nearest':
+            # gather the value of each point's own bin
+            z = np.where(flat >= 0, data.ravel()[flat], 0.)
+        else:
+            from scipy.interpolate import interpn
+
+            z = interpn((0.5*(x_e[1:] + x_e[:-1]), 0.5*(y_e[1:]+y_e[:-1])),
+                        data, np.vstack([x, y]).T,
+                        method=plotobj.density['interp'], bounds_error=False)
+            # To be sure to plot all data
+            z[np.where(np.isnan(z))] = 0.0
+
+        # Cap the number of markers, thinning the densest bins first
+        max_points = plotobj.density.get('max_points')
+        if max_points is not None and x.size > max_points:
+            keep = self._density_subsample(flat, counts, max_points)
+            x, y, z = x[keep], y[keep], z[keep]
+
         # Sort the points by density, so that the densest
         # points are plotted last
         if plotobj.density['sort']:
-            idx = z.argsort()
-            x, y, z = plotobj.x[idx], plotobj.y[idx], z[idx]
+            idx = z.argsort(kind='stable')
+            x, y, z = x[idx], y[idx], z[idx]
         cs = ax.scatter(x, y, c=z,
                         s=plotobj.markersize,
                         cmap=plotobj.density['cmap'],
+                        norm=self._density_norm(plotobj.density.get('norm')),
                         label=plotobj.label)
-        # below doing nothing? fix/remove in subsequent PR?
-        # norm = Normalize(vmin=np.min(z), vmax=np.max(z))
 
         if plotobj.density['colorbar']:
             self.cs = cs
 
+    def _density_image(self, plotobj, ax):
+        """
+        Uses Scatter Object to draw the 2d histogram of the points
+        as a rasterized mesh instead of one marker per point.
+        Empty bins are left transparent.
+        """
+        x = np.asarray(plotobj.x).ravel()
+        y = np.asarray(plotobj.y).ravel()
+        _idx = np.logical_and(~np.isnan(x), ~np.isnan(y))
+        if not _idx.all():
+            x, y = x[_idx], y[_idx]
+
+        data, x_e, y_e, _ = self._histogram2d_index(x, y, plotobj.density['bins'])
+
+        if plotobj.density['nsamples']:
+            # compute percentage of total for each bin, including the
+            # points outside explicit edges as in 'scatter' mode
+            data = data / max(x.size, 1) * 100.
+        else:
+            data = data / (max(data.sum(), 1.) * np.outer(np.diff(x_e), np.diff(y_e)))
+
+        cs = ax.pcolormesh(x_e, y_e, np.ma.masked_equal(data, 0.).T,
+                           cmap=plotobj.density['cmap'],
+                           norm=self._density_norm(plotobj.density.get('norm')),
+                           alpha=plotobj.alpha,
+                           rasterized=True)
+
+        if plotobj.density['colorbar']:
+            self.cs = cs
+
+    def _density_norm(self, norm):
+        """
+        Colormap normalization of a density plot from its name, which
+        older matplotlib versions do not accept directly.
+        """
+        norms = {
+            'linear': matplotlib.colors.Normalize,
+            'log': matplotlib.colors.LogNorm
+        }
+
+        if norm is None or isinstance(norm, matplotlib.colors.Normalize):
+            return norm
+        try:
+            return norms[norm]()
+        except (KeyError, TypeError):
+            raise ValueError(f'{norm} is not a valid density norm. ' +
+                             f'Valid norms are: {" | ".join(norms.keys())} ' +
+                             'or a matplotlib.colors.Normalize')
+
+    def _histogram2d_index(self, x, y, bins):
+        """
+        2d histogram of x and y (without NaNs) like np.histogram2d,
+        but binned with integer arithmetic on uniform bins and
+        np.bincount instead of a sort. Returns the counts of shape
+        (nx, ny), the x and y edges and the flat bin index of every
+        point (-1 for points outside explicit edges).
+        """
+        # same conventions as np.histogram2d for bins
+        if np.ndim(bins) == 0 or len(bins) not in [1, 2]:
+            bins = [bins, bins]
+
+        x_e, ix = self._bin_index(x, bins[0])
+        y_e, iy = self._bin_index(y, bins[-1])
+        nx, ny = x_e.size - 1, y_e.size - 1
+
+        flat = ix * ny + iy
+        flat[(ix < 0) | (iy < 0)] = -1
+        counts = np.bincount(flat[flat >= 0], minlength=nx * ny)
+
+        return counts.reshape(nx, ny).astype(float), x_e, y_e, flat
+
+    def _bin_index(self, values, bins):
+        """
+        Bin edges and the bin index of values for a number of uniform
+        bins spanning values or for explicit edges. The last bin
+        includes the upper edge and values outside the edges get -1.
+        """
+        if np.ndim(bins) == 0:
+            if values.size == 0:
+                lo, hi = 0., 1.
+            else:
+                lo, hi = float(values.min()), float(values.max())
+            if lo == hi:
+                lo, hi = lo - 0.5, hi + 0.5
+            edges = np.linspace(lo, hi, int(bins) + 1)
+        else:
+            edges = np.asarray(bins, dtype=float)
+
+        idx = bin_index(values, edges)
+        idx[(idx < 0) | (idx >= edges.size - 1)] = -1
+
+        return edges, idx
+
+    def _density_subsample(self, flat, counts, max_points):
+        """
+        Indices of about max_points points to draw. Every point of
+        sparse bins is kept while denser bins are sampled down to a
+        common cap, so the overall shape of the distribution is
+        preserved with far fewer markers.
+        """
+        occupied = np.sort(counts[counts > 0])
+        cum = np.cumsum(occupied)
+        # total number of points kept for a cap equal to each bin count
+        totals = cum + occupied * np.arange(occupied.size - 1, -1, -1)
+        i = np.searchsorted(totals, max_points)
+        if i == occupied.size:
+            return np.flatnonzero(flat >= 0)
+
+        cap = (max_points - (cum[i-1] if i else 0.)) / (occupied.size - i)
+        with np.errstate(divide='ignore'):
+            prob = np.where(flat >= 0, cap / counts.ravel()[flat], 0.)
+
+        rng = np.random.default_rng(0)
+        return np.flatnonzero(rng.random(flat.size) < prob)
+
     def _scatter(self, plotobj, ax):
         """
         Uses Scatter object to plot on axis.
@@ -597,11 +935,60 @@ class CreateFigure:
         """
         Uses Histogram object to plot on axis.
         """
-        skipvars = ['plottype', 'plot_ax', 'data']
+        if getattr(plotobj, 'counts', None) is not None:
+            self._prebinned_histogram(plotobj, ax)
+            return
+
+        skipvars = ['plottype', 'plot_ax', 'data', 'edges', 'counts']
         inputs = self._get_inputs_dict(skipvars, plotobj)
 
         ax.hist(plotobj.data, **inputs)
 
+    def _prebinned_histogram(self, plotobj, ax):
+        """
+        Draws a Histogram from its bin counts with ax.stairs or ax.bar,
+        following the ax.hist options that apply to binned data.
+        """
+        edges = np.asarray(plotobj.edges, dtype=float)
+        counts = np.asarray(plotobj.counts, dtype=float)
+        widths = np.diff(edges)
+
+        if plotobj.density:
+            counts = counts / (counts.sum() * widths)
+        if plotobj.cumulative:
+            values = counts * widths if plotobj.density else counts
+            if plotobj.cumulative < 0:
+                counts = values[::-1].cumsum()[::-1]
+            else:
+                counts = values.cumsum()
+
+        vertical = plotobj.orientation == 'vertical'
+        bottom = 0. if plotobj.bottom is None else plotobj.bottom
+        # remaining options, e.g. color, label or edgecolor, go to the artist
+        skipvars = ['plottype', 'plot_ax', 'data', 'edges', 'counts', 'bins', 'range',
+                    'density', 'weights', 'cumulative', 'bottom', 'histtype', 'align',
+                    'orientation', 'rwidth', 'log', 'stacked']
+        kwargs = self._get_inputs_dict(skipvars, plotobj)
+
+        if plotobj.histtype in ['step', 'stepfilled']:
+            ax.stairs(counts + bottom, edges, baseline=bottom,
+                      fill=plotobj.histtype == 'stepfilled',
+                      orientation=plotobj.orientation, **kwargs)
+        else:
+            rwidth = 1. if plotobj.rwidth is None else plotobj.rwidth
+            offset = {'left': -0.5, 'mid': 0., 'right': 0.5}[plotobj.align]
+            centers = edges[:-1] + widths * (0.5 + offset)
+            if vertical:
+                ax.bar(centers, counts, width=widths * rwidth, bottom=bottom, **kwargs)
+            else:
+                ax.barh(centers, counts, height=widths * rwidth, left=bottom, **kwargs)
+
+        if plotobj.log:
+            if vertical:
+                ax.set_yscale('log')
+            else:
+                ax.set_xscale('log')
+
     def _density(self, plotobj, ax):
         """
         Uses Density object to plot on axis.
@@ -796,9 +1183,12 @@ class CreateFigure:
         """
         Add grid on specified ax.
         """
-        try:
+        # cartopy GeoAxes draw gridlines in lat/lon
+        if hasattr(ax, 'gridlines'):
+            import cartopy.crs as ccrs
+
             ax.gridlines(crs=ccrs.PlateCarree(), **grid)
-        except AttributeError:
+        else:
             ax.grid(**grid)
 
     def _set_xlim(self, ax, xlim):
@@ -818,6 +1208,9 @@ class CreateFigure:
         Set x-ticks on specified ax.
         """
         if (latlon):
+            import cartopy.crs as ccrs
+            from cartopy.mpl.ticker import LongitudeFormatter, LatitudeFormatter
+
             ax.set_xticks(**xticks, crs=ccrs.PlateCarree())
             lon_formatter = LongitudeFormatter(zero_direction_label=True)
             lat_formatter = LatitudeFormatter()
@@ -831,6 +1224,8 @@ class CreateFigure:
         Set y-ticks on specified ax.
         """
         if (latlon):
+            import cartopy.crs as ccrs
+
             ax.set_yticks(**yticks, crs=ccrs.PlateCarree())
         else:
             ax.set_yticks(**yticks)
@@ -902,9 +1297,80 @@ class CreateFigure:
             plt.setp(ax.get_yticklabels(), visible=False)
 
     def _add_map_features(self, ax, map_features):
+        """
+        Add map features, from the map template cache if one is set.
+        """
+        # feature list set by older versions of add_map_features
+        if not isinstance(map_features, dict):
+            map_features = {'features': map_features, 'scale': 'auto',
+                            'tolerance': 'auto'}
+
+        if self.map_templates is None:
+            self._draw_map_features(ax, map_features)
+            return
+
+        # filled land and ocean are drawn below the data, the others above
+        below = [feat for feat in map_features['features'] if feat in ['land', 'ocean']]
+        above = [feat for feat in map_features['features'] if feat not in below]
+        for features, zorder in [(below, -1), (above, 1.5)]:
+            if features:
+                features = {**map_features, 'features': features}
+                image = self.map_templates.overlay(ax, features, self._draw_map_features,
+                                                   zorder=zorder)
+                self.template_layers.append((ax, image, features, zorder, self.fig.dpi))
+
+    def _redraw_templates(self, fmt, dpi):
+        """
+        Match the map templates to the output of save_figure: images
+        are redrawn at the output dpi, and the features of vector
+        formats are drawn as vectors.
+        """
+        layers = []
+        for ax, image, features, zorder, image_dpi in self.template_layers:
+            if fmt in ['pdf', 'svg', 'svgz', 'eps', 'ps']:
+                image.remove()
+                self._draw_map_features(ax, features)
+            elif dpi != image_dpi:
+                image.remove()
+                image = self.map_templates.overlay(ax, features, self._draw_map_features,
+                                                   zorder=zorder, dpi=dpi)
+                layers.append((ax, image, features, zorder, dpi))
+            else:
+                layers.append((ax, image, features, zorder, image_dpi))
+
+        self.template_layers = layers
+
+    def _draw_map_features(self, ax, map_features):
         """
         Factory to add map features.
         """
+        import cartopy.crs as ccrs
+
+        # size of a pixel in degrees and in projection units
+        ax.apply_aspect()
+        bbox = ax.get_window_extent()
+        extent = ax.get_extent(crs=ccrs.PlateCarree())
+        x_min, x_max, y_min, y_max = ax.get_extent()
+        degrees = max((extent[1] - extent[0]) / bbox.width,
+                      (extent[3] - extent[2]) / bbox.height)
+        units = max((x_max - x_min) / bbox.width, (y_max - y_min) / bbox.height)
+
+        scale = map_features['scale']
+        if scale == 'auto':
+            scale = feature_scale(degrees)
+        tolerance = map_features['tolerance']
+        if tolerance == 'auto':
+            tolerance = 0.5
+
+        if self.feature_store is not None:
+            # geometries are clipped to the lon/lat extent of the map
+            for feat in map_features['features']:
+                ax.add_feature(self.feature_store.feature(feat, ax.projection, extent,
+                                                          scale, tolerance * units))
+            return
+
+        import cartopy.feature as cfeature
+
         feature_dict = {
             'coastline': cfeature.COASTLINE,
             'borders': cfeature.BORDERS,
@@ -915,10 +1381,17 @@ class CreateFigure:
             'ocean': cfeature.OCEAN
         }
 
-        for feat in map_features:
+        for feat in map_features['features']:
             try:
-                ax.add_feature(feature_dict[feat])
+                feature = feature_dict[feat].with_scale(scale)
             except KeyError:
                 raise TypeError(f'{feat} is not a valid map feature.' +
                                 'Current map features supported are:\n' +
                                 f'{" | ".join(feature_dict.keys())}"')
+            if tolerance:
+                # simplify in degrees of latitude, which have the same
+                # length everywhere on the map
+                lat_tolerance = tolerance * (extent[3] - extent[2]) / bbox.height
+                geoms = [geom.simplify(lat_tolerance) for geom in feature.intersecting_geometries(extent)]
+                feature = cfeature.ShapelyFeature(geoms, feature.crs, **feature.kwargs)
+            ax.add_feature(feature)
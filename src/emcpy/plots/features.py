@@ -0,0 +1,233 @@
+# This work developed by NOAA/NWS/EMC under the Apache 2.0 license.
+import os
+import hashlib
+
+import numpy as np
+
+from emcpy.plots.map_tools import crop_halo, _covers_globe, _LRUDiskCache
+
+__all__ = ['FeatureStore', 'feature_scale']
+
+# Natural Earth category, name and style of each map feature, as in
+# cartopy.feature
+_features = {
+    'coastline': ('physical', 'coastline',
+                  {'edgecolor': 'black', 'facecolor': 'never'}),
+    'borders': ('cultural', 'admin_0_boundary_lines_land',
+                {'edgecolor': 'black', 'facecolor': 'never'}),
+    'states': ('cultural', 'admin_1_states_provinces_lakes',
+               {'edgecolor': 'black', 'facecolor': 'none'}),
+    'lakes': ('physical', 'lakes',
+              {'edgecolor': 'none', 'facecolor': (0.59375, 0.71484375, 0.8828125)}),
+    'rivers': ('physical', 'rivers_lake_centerlines',
+               {'edgecolor': (0.59375, 0.71484375, 0.8828125), 'facecolor': 'never'}),
+    'land': ('physical', 'land',
+             {'edgecolor': 'none', 'facecolor': (0.9375, 0.9375, 0.859375), 'zorder': -1}),
+    'ocean': ('physical', 'ocean',
+              {'edgecolor': 'none', 'facecolor': (0.59375, 0.71484375, 0.8828125), 'zorder': -1})
+}
+
+
+def feature_scale(resolution):
+    """
+    Natural Earth scale matching the size of a pixel of a map, so
+    global maps use the coarse geometries and zoomed maps the fine ones.
+
+    Args:
+        resolution : (float) size of a pixel in degrees
+    Returns:
+        '110m' above 0.1 degree, '50m' above 0.02 degree, '10m' otherwise.
+    """
+    if resolution > 0.1:
+        return '110m'
+    if resolution > 0.02:
+        return '50m'
+    return '10m'
+
+
+class FeatureStore(_LRUDiskCache):
+
+    # geometries read from each shapefile, shared by all stores of the process
+    _loaded = {}
+    suffix = '.npz'
+
+    def __init__(self, data_dir=None, cache_dir=None, maxsize=64):
+        """
+        Store of Natural Earth map features for nodes without network
+        access. Shapefiles are read once per process from a local data
+        directory; for each feature, scale, projection and domain the
+        geometries are clipped to the domain, projected and simplified
+        once, and kept in memory and optionally on disk as WKB.
+
+        Args:
+            data_dir : (str; default=None) directory of the Natural Earth
+                       shapefiles, either flat (ne_110m_coastline.shp) or
+                       in the cartopy layout
+                       (shapefiles/natural_earth/physical/...); None uses
+                       the cartopy data directories, which may download
+            cache_dir : (str; default=None) directory of the on-disk cache
+                        of processed geometries; None keeps them in memory
+            maxsize : (int; default=64) number of processed features kept
+                      in memory
+        """
+        super().__init__(maxsize, cache_dir)
+        self.data_dir = data_dir
+
+    @staticmethod
+    def features():
+        """
+        Names of the available map features.
+        """
+        return list(_features.keys())
+
+    def feature(self, name, projection, extent=None, scale='110m', tolerance=None):
+        """
+        Map feature ready to be added to an axes in the given projection.
+
+        Args:
+            name : (str) map feature, see FeatureStore.features
+            projection : (cartopy CRS) projection of the axes
+            extent : (tuple; default=None) lon/lat extent of the domain
+                     the geometries are clipped to (plus a halo); None
+                     keeps the whole globe
+            scale : (str; default='110m') Natural Earth scale: '110m',
+                    '50m' or '10m'
+            tolerance : (float; default=None) simplification tolerance in
+                        projection units; None uses 1/2000 of the width
+                        of the projected domain and 0 keeps every vertex
+        Returns:
+            A cartopy ShapelyFeature in the projection.
+        """
+        import cartopy.feature as cfeature
+
+        if name not in _features:
+            raise TypeError(f'{name} is not a valid map feature. ' +
+                            'Current map features supported are:\n' +
+                            f'{" | ".join(_features.keys())}')
+
+        return cfeature.ShapelyFeature(self.geometries(name, projection, extent,
+                                                       scale, tolerance),
+                                       projection, **_features[name][2])
+
+    def geometries(self, name, projection, extent=None, scale='110m', tolerance=None):
+        """
+        Clipped, projected and simplified geometries of a map feature.
+        Arguments are the same as for FeatureStore.feature.
+        """
+        if extent is not None:
+            extent = tuple(float(e) for e in np.round(extent, 6))
+        key = hashlib.blake2b(repr((name, scale, projection.proj4_init,
+                                    extent, tolerance)).encode(),
+                              digest_size=16).hexdigest()
+
+        return self._lookup(key, lambda: self._process(name, projection, extent,
+                                                       scale, tolerance))
+
+    def load(self, name, scale='110m'):
+        """
+        Geometries of a map feature in lon/lat, read once per process.
+        """
+        import cartopy.io.shapereader as shpreader
+
+        path = self._path(name, scale)
+        if path not in self._loaded:
+            self._loaded[path] = list(shpreader.Reader(path).geometries())
+
+        return self._loaded[path]
+
+    def _path(self, name, scale):
+        """
+        Path of the shapefile of a map feature.
+        """
+        category, ne_name, _ = _features[name]
+        filename = f'ne_{scale}_{ne_name}.shp'
+
+        if self.data_dir is None:
+            import cartopy.io.shapereader as shpreader
+            return shpreader.natural_earth(resolution=scale, category=category,
+                                           name=ne_name)
+
+        for path in [os.path.join(self.data_dir, filename),
+                     os.path.join(self.data_dir, 'shapefiles', 'natural_earth',
+                                  category, filename)]:
+            if os.path.exists(path):
+                return path
+
+        raise FileNotFoundError(f'{filename} not found in {self.data_dir}')
+
+    def _process(self, name, projection, extent, scale, tolerance):
+        """
+        Clip the geometries to the extent plus a halo, project them and
+        simplify them. Geometries are handled one by one with the
+        methods of Shapely 1.x and 2.x alike.
+        """
+        from shapely.geometry import box
+        from shapely.ops import unary_union
+        import cartopy.crs as ccrs
+
+        geoms = self.load(name, scale)
+
+        halo = None if extent is None else crop_halo(extent)
+        if extent is not None and not _covers_globe(extent, halo):
+            boxes = _clip_boxes(extent, halo)
+            clip = unary_union([box(*b) for b in boxes])
+            # only intersect geometries whose bounding box overlaps the domain
+            geoms = [geom.intersection(clip) for geom in geoms
+                     if any(_overlaps(geom.bounds, b) for b in boxes)]
+
+        source = ccrs.PlateCarree()
+        geoms = [projection.project_geometry(geom, source) for geom in geoms]
+        geoms = [geom for geom in geoms if not geom.is_empty]
+
+        if tolerance is None and geoms:
+            bounds = np.array([geom.bounds for geom in geoms])
+            tolerance = (bounds[:, 2].max() - bounds[:, 0].min()) / 2000.
+        if tolerance:
+            geoms = [geom.simplify(tolerance) for geom in geoms]
+
+        return geoms
+
+    def _save(self, f, geoms):
+        """
+        Write the geometries as WKB, concatenated with their offsets.
+        """
+        from shapely import wkb
+
+        data = [wkb.dumps(geom) for geom in geoms]
+        offsets = np.cumsum([0] + [len(b) for b in data])
+        np.savez(f, wkb=np.frombuffer(b''.join(data), dtype=np.uint8), offsets=offsets)
+
+    def _load(self, path):
+        from shapely import wkb
+
+        with np.load(path) as f:
+            data, offsets = f['wkb'].tobytes(), f['offsets']
+
+        return [wkb.loads(data[i:j]) for i, j in zip(offsets[:-1], offsets[1:])]
+
+
+def _overlaps(bounds, box):
+    """
+    Whether two (west, south, east, north) boxes overlap.
+    """
+    return (bounds[0] <= box[2] and bounds[2] >= box[0] and
+            bounds[1] <= box[3] and bounds[3] >= box[1])
+
+
+def _clip_boxes(extent, halo):
+    """
+    Lon/lat boxes (west, south, east, north) covering an extent plus a
+    halo, split in two at the dateline when the extent crosses it, as
+    in emcpy.stats.regional.domain_mask.
+    """
+    south, north = max(extent[2] - halo, -90.), min(extent[3] + halo, 90.)
+    if extent[1] - extent[0] + 2. * halo >= 360.:
+        return [(-180., south, 180., north)]
+
+    # wrapped into [-180, 180)
+    west = (extent[0] - halo + 180.) % 360. - 180.
+    east = (extent[1] + halo + 180.) % 360. - 180.
+    if west <= east:
+        return [(west, south, east, north)]
+
+    return [(west, south, 180., north), (-180., south, east, north)]
@@ -1,5 +1,3 @@
-import numpy as np
-
 __all__ = ['MapScatter', 'MapGridded', 'MapContour',
            'MapContourf']
 
@@ -35,6 +33,32 @@ class MapScatter:
         self.label = None
         self.colorbar = False if data is None else True
 
+    def thin(self, resolution='auto', method='mean'):
+        """
+        Thin the points before plotting by keeping at most one
+        (super)observation per lat/lon grid box. The markersize of a
+        thinned layer must be a scalar.
+
+        Args:
+            resolution : (float or str; default='auto') grid box size in
+                         degrees, or 'auto' for boxes the size of one
+                         pixel of the figure over the plotted domain
+            method : (str; default='mean') 'mean', 'min', 'max' or 'first'
+                     point of each grid box, see map_tools.superob
+        """
+        methods = ['mean', 'min', 'max', 'first']
+        if method not in methods:
+            raise ValueError(f'{method} is not a valid thinning method. ' +
+                             f'Valid methods are: {" | ".join(methods)}')
+        # the sizes of the points would not match the thinned points
+        if isinstance(self.markersize, (list, tuple)) or getattr(self.markersize, 'ndim', 0):
+            raise ValueError('markersize must be a scalar to thin a MapScatter layer.')
+
+        self.thinning = {
+            'resolution': resolution,
+            'method': method
+        }
+
 
 class MapGridded:
 
@@ -54,14 +78,13 @@ class MapGridded:
         self.data = data
 
         self.cmap = 'viridis'
-        if latitude.ndim == 3:
-            self.vmin = np.nanmin(data)
-            self.vmax = np.nanmax(data)
-        else:
-            self.vmin = None
-            self.vmax = None
+        self.vmin = None
+        self.vmax = None
         self.alpha = None
         self.colorbar = True
+        # cubed-sphere tiles are drawn as one image at figure resolution;
+        # set to 'pcolormesh' to draw every grid cell instead
+        self.renderer = 'raster' if latitude.ndim == 3 else 'pcolormesh'
 
 
 class MapContour:
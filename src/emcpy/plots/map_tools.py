@@ -1,5 +1,11 @@
 # This work developed by NOAA/NWS/EMC under the Apache 2.0 license.
-import cartopy.crs as ccrs
+import os
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+from emcpy.stats.regional import domain_mask
 
 
 class Domain:
@@ -14,35 +20,12 @@ class Domain:
         """
         domain = domain.lower()
 
-        map_domains = {
-            "global": self._global,
-            "north": self._north,
-            "south": self._south,
-            "north america": self._north_america,
-            "europe": self._europe,
-            "conus": self._conus,
-            "northeast": self._northeast,
-            "mid atlantic": self._mid_atlantic,
-            "southeast": self._southeast,
-            "ohio valley": self._ohio_valley,
-            "upper midwest": self._upper_midwest,
-            "north central": self._north_central,
-            "central": self._central,
-            "south central": self._south_central,
-            "northwest": self._northwest,
-            "colorado": self._colorado,
-            "boston nyc": self._boston_nyc,
-            "sf bay area": self._sf_bay_area,
-            "la vegas": self._la_vegas,
-            "custom": self._custom
-        }
-
         try:
-            map_domains[domain](dd=dd)
+            self.map_domains[domain](self, dd=dd)
         except KeyError:
             raise TypeError(f'{domain} is not a valid domain.' +
                             'Current domains supported are:\n' +
-                            f'{" | ".join(map_domains.keys())}"')
+                            f'{" | ".join(self.map_domains.keys())}"')
 
     def _global(self, dd=dict()):
         """
@@ -315,6 +298,30 @@ class Domain:
                             "with keys: 'extent', 'xticks', 'yticks', " +
                             "as tuples and 'cenlon' and 'cenlat' as floats.")
 
+    # names of the supported domains and the methods that set them up
+    map_domains = {
+        "global": _global,
+        "north": _north,
+        "south": _south,
+        "north america": _north_america,
+        "europe": _europe,
+        "conus": _conus,
+        "northeast": _northeast,
+        "mid atlantic": _mid_atlantic,
+        "southeast": _southeast,
+        "ohio valley": _ohio_valley,
+        "upper midwest": _upper_midwest,
+        "north central": _north_central,
+        "central": _central,
+        "south central": _south_central,
+        "northwest": _northwest,
+        "colorado": _colorado,
+        "boston nyc": _boston_nyc,
+        "sf bay area": _sf_bay_area,
+        "la vegas": _la_vegas,
+        "custom": _custom
+    }
+
 
 class MapProjection:
 
@@ -357,6 +364,8 @@ class MapProjection:
 
     def _platecarree(self):
         """Creates projection using PlateCarree from Cartopy."""
+        import cartopy.crs as ccrs
+
         self.cenlon = 0 if self.cenlon is None else self.cenlon
 
         self.projection = ccrs.PlateCarree(central_longitude=self.cenlon,
@@ -366,6 +375,8 @@ class MapProjection:
 
     def _miller(self):
         """Creates projection using Miller from Cartopy."""
+        import cartopy.crs as ccrs
+
         self.cenlon = 0 if self.cenlon is None else self.cenlon
 
         self.projection = ccrs.Miller(central_longitude=self.cenlon,
@@ -375,6 +386,7 @@ class MapProjection:
 
     def _lambertconformal(self):
         """Creates projection using Lambert Conformal from Cartopy."""
+        import cartopy.crs as ccrs
 
         if self.cenlon is None or self.cenlat is None:
             raise TypeError("Need 'cenlon' and cenlat to plot Lambert "
@@ -391,6 +403,8 @@ class MapProjection:
         Creates projection using Orthographic from Cartopy and
         orients it from central latitude 90 degrees.
         """
+        import cartopy.crs as ccrs
+
         self.cenlon = 0 if self.cenlon is None else self.cenlon
 
         self.projection = ccrs.Orthographic(central_longitude=self.cenlon,
@@ -403,9 +417,481 @@ class MapProjection:
         Creates projection using Orthographic from Cartopy and
         orients it from central latitude -90 degrees.
         """
+        import cartopy.crs as ccrs
+
         self.cenlon = 0 if self.cenlon is None else self.cenlon
 
         self.projection = ccrs.Orthographic(central_longitude=self.cenlon,
                                             central_latitude=-90,
                                             globe=self.globe)
         self.transform = ccrs.PlateCarree()
+
+
+def superob(latitude, longitude, data=None, resolution=1., method='mean'):
+    """
+    Thin scattered points to at most one point per lat/lon grid box
+    (superobbing). Points are grouped with a single sort of their box
+    index, so millions of observations are reduced without a Python
+    loop. Points with NaN coordinates or NaN or masked data are dropped.
+
+    Args:
+        latitude : (array type) latitude of the points
+        longitude : (array type) longitude of the points
+        data : (array type; default=None) data of the points
+        resolution : (float; default=1.) size of the grid boxes in degrees
+        method : (str; default='mean') 'mean' averages the positions and
+                 data of each box, 'min' and 'max' keep the point with the
+                 smallest or largest data and 'first' keeps the first point
+    Returns:
+        latitude, longitude and data (None if not given) of the thinned
+        points.
+    """
+    methods = ['mean', 'min', 'max', 'first']
+    if method not in methods:
+        raise ValueError(f'{method} is not a valid thinning method. ' +
+                         f'Valid methods are: {" | ".join(methods)}')
+    if not resolution > 0:
+        raise ValueError('resolution must be a positive number of degrees.')
+
+    lat = np.asarray(latitude, dtype=float).ravel()
+    lon = np.asarray(longitude, dtype=float).ravel()
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    if data is not None:
+        values = np.ma.asarray(data).ravel()
+        valid &= ~np.ma.getmaskarray(values)
+        values = values.data
+        valid &= ~np.isnan(values)
+    if not valid.all():
+        lat, lon = lat[valid], lon[valid]
+        values = None if data is None else values[valid]
+
+    if lat.size == 0:
+        return lat, lon, None if data is None else values
+
+    # grid box of every point, longitudes wrapped into [-180, 180)
+    nlon = int(np.ceil(360. / resolution))
+    ilat = np.floor((np.clip(lat, -90., 90.) + 90.) / resolution).astype(np.int64)
+    ilon = np.floor(((lon + 180.) % 360.) / resolution).astype(np.int64) % nlon
+    box = ilat * nlon + ilon
+
+    if method in ['min', 'max'] and data is not None:
+        # order by box, then by data so the extreme is first/last in a box
+        order = np.lexsort((values, box))
+    else:
+        order = np.argsort(box, kind='stable')
+    box = box[order]
+    starts = np.flatnonzero(np.diff(box, prepend=-1))
+
+    if method == 'mean':
+        nbox = np.diff(np.append(starts, box.size))
+        wrapped = (lon[order] + 180.) % 360. - 180.
+        lat = np.add.reduceat(lat[order], starts) / nbox
+        lon = np.add.reduceat(wrapped, starts) / nbox
+        if data is not None:
+            values = np.add.reduceat(values[order], starts) / nbox
+    else:
+        if method == 'max' and data is not None:
+            keep = order[np.append(starts[1:], box.size) - 1]
+        else:
+            keep = order[starts]
+        lat, lon = lat[keep], lon[keep]
+        if data is not None:
+            values = values[keep]
+
+    return lat, lon, None if data is None else values
+
+
+class _LRUDiskCache:
+
+    # extension of the files of the on-disk cache
+    suffix = '.npy'
+
+    def __init__(self, maxsize, cache_dir=None):
+        """
+        Base of the caches of map drawing: values are kept in memory
+        with least recently used eviction and optionally stored on disk,
+        one file per key, so they are shared by processes and runs.
+        Subclasses change how values are written and read with
+        _save/_load.
+
+        Args:
+            maxsize : (int) number of values kept in memory
+            cache_dir : (str; default=None) directory of the on-disk
+                        cache; None keeps the cache in memory only
+        """
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def clear(self):
+        """
+        Empty the in-memory cache; files on disk are kept.
+        """
+        self._cache.clear()
+
+    def __getstate__(self):
+        """
+        Only the configuration is pickled (e.g. with a figure sent to a
+        worker process), not the in-memory contents; processes share
+        values through cache_dir.
+        """
+        state = self.__dict__.copy()
+        state['_cache'] = OrderedDict()
+        state['hits'] = state['misses'] = 0
+
+        return state
+
+    def _lookup(self, key, compute):
+        """
+        Value of key from memory, then from disk, else from compute().
+        """
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        path = None if self.cache_dir is None else os.path.join(self.cache_dir, key + self.suffix)
+        if path is not None and os.path.exists(path):
+            self.hits += 1
+            value = self._load(path)
+        else:
+            self.misses += 1
+            value = compute()
+            if path is not None:
+                # write then rename so concurrent readers never see a partial file
+                tmpfile = f'{path}.{os.getpid()}.tmp'
+                with open(tmpfile, 'wb') as f:
+                    self._save(f, value)
+                os.replace(tmpfile, path)
+
+        self._cache[key] = value
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+        return value
+
+    def _save(self, f, value):
+        np.save(f, value)
+
+    def _load(self, path):
+        return np.load(path, mmap_mode='r')
+
+
+class ProjectionCache(_LRUDiskCache):
+
+    def __init__(self, maxsize=32, cache_dir=None):
+        """
+        Cache of coordinates projected from lat/lon to a map projection.
+        Static coordinates (observation stations, model grids) are
+        projected once and reused by every figure drawn with the same
+        projection, instead of cartopy re-projecting them at each draw.
+        Entries are keyed by a fingerprint of the coordinates and the
+        source and target projections, kept in memory with least
+        recently used eviction and optionally stored on disk as .npy
+        files that are memory mapped when read back.
+
+        Args:
+            maxsize : (int; default=32) number of projected coordinate
+                      sets kept in memory
+            cache_dir : (str; default=None) directory of the on-disk
+                        cache; None keeps the cache in memory only
+        """
+        super().__init__(maxsize, cache_dir)
+
+    @staticmethod
+    def fingerprint(longitude, latitude):
+        """
+        Hash of the shape, type and values of the coordinates.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for coord in (longitude, latitude):
+            coord = np.ascontiguousarray(coord)
+            digest.update(f'{coord.shape}{coord.dtype.str}'.encode())
+            digest.update(coord.data)
+
+        return digest.hexdigest()
+
+    def project(self, longitude, latitude, source, target):
+        """
+        Project coordinates from the source to the target projection.
+        Points that fall outside of the target projection are NaN.
+
+        Args:
+            longitude : (array type) longitudes (x in source)
+            latitude : (array type) latitudes (y in source)
+            source : (cartopy CRS) projection of the coordinates,
+                     e.g. MapProjection.transform
+            target : (cartopy CRS) projection to draw in, e.g.
+                     MapProjection.projection
+        Returns:
+            x and y of the points in the target projection, read only.
+        """
+        if source == target:
+            return longitude, latitude
+
+        grid = self.fingerprint(longitude, latitude)
+        key = hashlib.blake2b(f'{grid}|{source.proj4_init}|{target.proj4_init}'.encode(),
+                              digest_size=16).hexdigest()
+        xy = self._lookup(key, lambda: self._transform(longitude, latitude, source, target))
+
+        return xy[0], xy[1]
+
+    def _transform(self, longitude, latitude, source, target):
+        """
+        Project the points, stacking x and y in one array.
+        """
+        lon = np.asarray(longitude, dtype=float)
+        lat = np.asarray(latitude, dtype=float)
+        lon, lat = np.broadcast_arrays(lon, lat)
+
+        xyz = target.transform_points(source, lon.ravel(), lat.ravel())
+        xy = np.moveaxis(xyz[:, :2], 1, 0).reshape((2,) + lon.shape)
+        xy[~np.isfinite(xy)] = np.nan
+        xy = np.ascontiguousarray(xy)
+        xy.flags.writeable = False
+
+        return xy
+
+
+def crop_halo(extent):
+    """
+    Default margin in degrees kept around a domain when cropping:
+    10% of the larger side of the extent and at least 1 degree.
+    """
+    lon_min, lon_max, lat_min, lat_max = extent
+
+    return max(1., 0.1 * max(lon_max - lon_min, lat_max - lat_min))
+
+
+def _covers_globe(extent, halo):
+    lon_min, lon_max, lat_min, lat_max = extent
+
+    return (lon_max - lon_min + 2. * halo >= 360. and
+            lat_min - halo <= -90. and lat_max + halo >= 90.)
+
+
+def crop_points(latitude, longitude, extent, halo=None):
+    """
+    Mask of the scattered points within a domain extent plus a halo.
+    Longitudes may be in [-180, 180) or [0, 360) and extents that
+    cross the dateline are handled.
+
+    Args:
+        latitude : (array type) latitude of the points
+        longitude : (array type) longitude of the points
+        extent : (tuple) (lon_min, lon_max, lat_min, lat_max) extent
+        halo : (float; default=None) margin in degrees, see crop_halo
+    Returns:
+        A boolean mask of the points to keep, or None if the extent
+        covers the whole globe.
+    """
+    halo = crop_halo(extent) if halo is None else halo
+    if _covers_globe(extent, halo):
+        return None
+
+    return domain_mask(latitude, longitude, tuple(extent), halo=halo)
+
+
+def crop_grid(latitude, longitude, data, extent, halo=None):
+    """
+    Crop a gridded field to the rows and columns that overlap a domain
+    extent plus a halo, so pcolormesh and contour only process the
+    visible part of the grid. Works for regular grids (1-D or 2-D
+    coordinates) and curvilinear grids. On grids that are periodic in
+    longitude, a domain that straddles the edge of the grid (e.g.
+    Europe on a 0-360 grid) is cut out contiguously and its longitudes
+    unwrapped to the frame of the domain.
+
+    Args:
+        latitude : (array type) 1-D or 2-D latitudes
+        longitude : (array type) 1-D or 2-D longitudes
+        data : (array type) 2-D field
+        extent : (tuple) (lon_min, lon_max, lat_min, lat_max) extent
+        halo : (float; default=None) margin in degrees, see crop_halo
+    Returns:
+        latitude, longitude and data of the cropped grid, unchanged if
+        the extent covers the whole globe (or the coordinates are
+        neither the centers nor the edges of the data cells), or None
+        if the grid does not overlap the domain.
+    """
+    halo = crop_halo(extent) if halo is None else halo
+    if _covers_globe(extent, halo):
+        return latitude, longitude, data
+
+    lat = np.asarray(latitude)
+    lon = np.asarray(longitude)
+    regular = lat.ndim == 1 and lon.ndim == 1
+    if regular:
+        mask = domain_mask(lat[:, np.newaxis], lon[np.newaxis, :], tuple(extent), halo=halo)
+    else:
+        mask = domain_mask(lat, lon, tuple(extent), halo=halo)
+    if not mask.any():
+        return None
+
+    ny, nx = mask.shape
+    # coordinates are either cell centers or cell edges, one longer
+    # than the data in each dimension (pcolormesh shading='flat')
+    edges = np.shape(data)[-2:] == (ny - 1, nx - 1)
+    if not edges and np.shape(data)[-2:] != (ny, nx):
+        return latitude, longitude, data
+
+    rows = np.flatnonzero(mask.any(axis=1))
+    rows = np.arange(max(rows[0] - 1, 0), min(rows[-1] + 2, ny))
+
+    cols = np.flatnonzero(mask.any(axis=0))
+    # the largest gap between selected columns, going around the grid
+    gaps = np.diff(np.append(cols, cols[0] + nx))
+    gap = np.argmax(gaps)
+    wrapped = gap != cols.size - 1 and _periodic(lon)
+    if wrapped and edges:
+        # the last edge repeats the first one, keep the grid whole
+        return latitude, longitude, data
+    if wrapped:
+        cols = np.arange(cols[gap + 1] - 1, cols[gap] + nx + 2) % nx
+    else:
+        cols = np.arange(max(cols[0] - 1, 0), min(cols[-1] + 2, nx))
+
+    if regular:
+        lat = lat[rows]
+        lon = lon[cols]
+    else:
+        lat = lat[rows][:, cols]
+        lon = lon[rows][:, cols]
+    if edges:
+        # the cells between the kept edges
+        rows, cols = rows[:-1], cols[:-1]
+    data = np.take(np.take(data, rows, axis=-2), cols, axis=-1)
+
+    if wrapped:
+        # continuous longitudes, centered on the domain
+        lon = np.unwrap(lon, period=360., axis=-1)
+        center = 0.5 * (extent[0] + extent[1])
+        lon = lon + 360. * np.round((center - np.nanmean(lon)) / 360.)
+
+    return lat, lon, data
+
+
+def _periodic(longitude):
+    """
+    Whether the columns of a grid go all around the globe.
+    """
+    lon = np.asarray(longitude)
+    lon = lon if lon.ndim == 1 else lon[lon.shape[0] // 2]
+    spacing = np.nanmax(np.abs((np.diff(lon) + 180.) % 360. - 180.))
+
+    return np.nanmax(lon) - np.nanmin(lon) + 2. * spacing >= 360.
+
+
+class RasterRemap:
+
+    def __init__(self, maxsize=8):
+        """
+        Cached nearest neighbor remapping of grid points (e.g. the six
+        tiles of an FV3 cubed-sphere grid) to the pixels of a map. The
+        k-d tree of a grid and the grid point index of every pixel are
+        computed once per grid, projection, extent and image size, so
+        redrawing fields on the same grid only costs one gather.
+
+        Args:
+            maxsize : (int; default=8) number of grids and of pixel
+                      indices kept in memory
+        """
+        self.maxsize = maxsize
+        self._trees = OrderedDict()
+        self._indices = OrderedDict()
+
+    def indices(self, longitude, latitude, projection, extent, shape):
+        """
+        Grid point nearest to the center of every pixel of an image.
+
+        Args:
+            longitude : (array type) longitude of the grid points
+            latitude : (array type) latitude of the grid points
+            projection : (cartopy CRS) projection of the image
+            extent : (tuple) (x0, x1, y0, y1) extent of the image in
+                     projection coordinates
+            shape : (tuple) (height, width) of the image in pixels
+        Returns:
+            Flat grid point index of each pixel with the given shape,
+            -1 for pixels off the globe or away from the grid.
+        """
+        grid = ProjectionCache.fingerprint(longitude, latitude)
+        key = (grid, projection.proj4_init, tuple(np.round(extent, 6)), tuple(shape))
+        if key in self._indices:
+            self._indices.move_to_end(key)
+            return self._indices[key]
+
+        tree, bound = self._tree(grid, longitude, latitude)
+
+        import cartopy.crs as ccrs
+
+        x0, x1, y0, y1 = extent
+        height, width = shape
+        x = x0 + (np.arange(width) + 0.5) * (x1 - x0) / width
+        y = y0 + (np.arange(height) + 0.5) * (y1 - y0) / height
+        x, y = np.meshgrid(x, y)
+        lonlat = ccrs.Geodetic().transform_points(projection, x.ravel(), y.ravel())
+
+        idx = np.full(x.size, -1, dtype=np.intp)
+        valid = np.isfinite(lonlat[:, :2]).all(axis=1)
+        if valid.any():
+            dist, nearest = tree.query(_unit_vectors(lonlat[valid, 0], lonlat[valid, 1]),
+                                       distance_upper_bound=bound)
+            idx[valid] = np.where(np.isfinite(dist), nearest, -1)
+        idx = idx.reshape(shape)
+        idx.flags.writeable = False
+
+        self._indices[key] = idx
+        if len(self._indices) > self.maxsize:
+            self._indices.popitem(last=False)
+
+        return idx
+
+    def _tree(self, grid, longitude, latitude):
+        """
+        k-d tree of the grid points on the unit sphere and the largest
+        distance at which a pixel is still considered on the grid.
+        """
+        if grid in self._trees:
+            self._trees.move_to_end(grid)
+            return self._trees[grid]
+
+        from scipy.spatial import cKDTree
+
+        lon = np.asarray(longitude, dtype=float)
+        lat = np.asarray(latitude, dtype=float)
+        xyz = _unit_vectors(lon, lat)
+
+        # spacing between neighbors along the grid rows and columns
+        spacing = 0.
+        for axis in range(min(lon.ndim, 2)):
+            if lon.shape[axis] > 1:
+                pairs = np.diff(xyz, axis=axis)
+                spacing = max(spacing, np.nanmax(np.sqrt((pairs * pairs).sum(axis=-1))))
+        if spacing == 0.:
+            spacing = np.sqrt(4. * np.pi / max(lon.size, 1))
+
+        xyz = xyz.reshape(-1, 3)
+        tree = cKDTree(np.where(np.isfinite(xyz), xyz, 10.))
+        self._trees[grid] = (tree, 1.5 * spacing)
+        if len(self._trees) > self.maxsize:
+            self._trees.popitem(last=False)
+
+        return self._trees[grid]
+
+
+def _unit_vectors(longitude, latitude):
+    """
+    Cartesian coordinates of lat/lon points on the unit sphere, with
+    a trailing axis of size 3.
+    """
+    lon = np.radians(longitude)
+    lat = np.radians(latitude)
+    coslat = np.cos(lat)
+
+    return np.stack([coslat * np.cos(lon), coslat * np.sin(lon), np.sin(lat)], axis=-1)
@@ -46,14 +46,29 @@ class Scatter:
     def density_scatter(self):
         """
         Include density scatter plot info as attributes.
+
+        'mode' selects how the density is drawn: 'scatter' colors
+        every point by the density of its bin, 'image' draws the 2-D
+        histogram itself as a rasterized mesh, which is much faster
+        and smaller for millions of points. 'norm' is the colormap
+        normalization: 'linear', 'log' or a matplotlib Normalize.
+
+        In 'scatter' mode, 'interp' is the method used to color points
+        from the 2-D histogram; 'nearest' looks up the bin of each
+        point directly and is the fastest. 'max_points' caps the
+        number of markers drawn by sampling points from the densest
+        bins first.
         """
         self.density = {
+            'mode': 'scatter',
             'sort': True,
             'cmap': 'nipy_spectral_r',
             'colorbar': True,
             'bins': [100, 100],
             'interp': 'linear',
-            'nsamples': True
+            'nsamples': True,
+            'norm': None,
+            'max_points': None
         }
 
 
@@ -70,6 +85,8 @@ class Histogram:
         self.plottype = 'histogram'
 
         self.data = data
+        self.edges = None
+        self.counts = None
 
         self.bins = 10
         self.range = None
@@ -83,10 +100,55 @@ class Histogram:
         self.rwidth = None
         self.log = False
         self.color = 'tab:blue'
-        self.label = f'n={np.count_nonzero(~np.isnan(data))}'
+        self.label = None if data is None else f'n={np.count_nonzero(~np.isnan(data))}'
         self.stacked = False
         self.alpha = None
 
+    @classmethod
+    def from_counts(cls, edges, counts):
+        """
+        Create a Histogram from counts that are already binned, e.g.
+        by `emcpy.stats.HistogramAccumulator` or merged from many
+        files. The raw data is never needed to draw the figure.
+        Args:
+            edges : (array type) bin edges, one more than counts
+            counts : (array type) count (or weight) in each bin
+        """
+        edges = np.asarray(edges, dtype=float)
+        counts = np.asarray(counts)
+        if edges.ndim != 1 or edges.size != counts.size + 1:
+            raise ValueError('edges must be a 1-D array with one more ' +
+                             'element than counts.')
+
+        hist = cls(None)
+        hist.edges = edges
+        hist.counts = counts
+        hist.bins = edges
+        hist.label = f'n={int(np.sum(counts))}'
+
+        return hist
+
+    def prebin(self):
+        """
+        Bin the data once with the current bins, range and weights,
+        then drop the raw data so the figure can be regenerated
+        from the counts.
+        """
+        if self.data is None:
+            return
+
+        data = np.asarray(self.data).ravel()
+        weights = None if self.weights is None else np.asarray(self.weights).ravel()
+        valid = ~np.isnan(data)
+        if weights is not None:
+            weights = weights[valid]
+
+        self.counts, self.edges = np.histogram(data[valid], bins=self.bins,
+                                               range=self.range, weights=weights)
+        self.bins = self.edges
+        self.data = None
+        self.weights = None
+
 
 class Density():
 
@@ -0,0 +1,365 @@
+# This work developed by NOAA/NWS/EMC under the Apache 2.0 license.
+import os
+import json
+import hashlib
+import importlib
+
+import numpy as np
+
+__all__ = ['figure_to_dict', 'figure_from_dict', 'to_yaml', 'from_yaml',
+           'spec_fingerprint', 'release', 'NpyArray', 'NetCDFVariable',
+           'SharedArray']
+
+# modules whose classes may be created from a spec
+_layer_modules = ['emcpy.plots.plots', 'emcpy.plots.map_plots']
+
+# CreateFigure options kept in a spec
+_figure_options = ['nrows', 'ncols', 'figsize', 'sharex', 'sharey', 'crop_to_domain']
+
+
+class NpyArray:
+
+    def __init__(self, path, mmap=True):
+        """
+        Reference to an array stored in a .npy file.
+
+        Args:
+            path : (str) path of the .npy file
+            mmap : (bool; default=True) memory map the file when loaded
+                   so only the pages that are used are read
+        """
+        self.path = path
+        self.mmap = mmap
+
+    def load(self):
+        return np.load(self.path, mmap_mode='r' if self.mmap else None)
+
+    def to_dict(self):
+        return {'handle': 'npy', 'path': self.path, 'mmap': self.mmap}
+
+
+class NetCDFVariable:
+
+    def __init__(self, path, variable, index=None):
+        """
+        Reference to a variable of a netCDF file.
+
+        Args:
+            path : (str) path of the netCDF file
+            variable : (str) name of the variable
+            index : (list; default=None) index of each dimension to read,
+                    an int or None (whole dimension); None reads it all
+        """
+        self.path = path
+        self.variable = variable
+        self.index = index
+
+    def load(self):
+        from netCDF4 import Dataset
+
+        index = Ellipsis if self.index is None else \
+            tuple(slice(None) if i is None else i for i in self.index)
+        with Dataset(self.path, 'r') as dataset:
+            return dataset.variables[self.variable][index]
+
+    def to_dict(self):
+        return {'handle': 'netcdf', 'path': self.path,
+                'variable': self.variable, 'index': self.index}
+
+
+class SharedArray:
+
+    # shared memory blocks attached in this process, kept open while
+    # arrays viewing them may be in use
+    _attached = {}
+
+    def __init__(self, name, shape, dtype):
+        """
+        Reference to an array in a multiprocessing shared memory block,
+        so worker processes on the same node read the array without
+        a copy. Create one with SharedArray.create and free the block
+        with unlink once all figures are rendered.
+
+        Args:
+            name : (str) name of the shared memory block
+            shape : (tuple) shape of the array
+            dtype : (str) dtype of the array
+        """
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = dtype
+
+    @classmethod
+    def create(cls, array):
+        """
+        Copy an array to a new shared memory block.
+        """
+        from multiprocessing import shared_memory
+
+        array = np.asarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        cls._attached[shm.name] = shm
+
+        return cls(shm.name, array.shape, array.dtype.str)
+
+    def load(self):
+        from multiprocessing import shared_memory
+
+        if self.name not in self._attached:
+            self._attached[self.name] = shared_memory.SharedMemory(name=self.name)
+        array = np.ndarray(self.shape, dtype=self.dtype,
+                           buffer=self._attached[self.name].buf)
+        array.flags.writeable = False
+
+        return array
+
+    def unlink(self):
+        """
+        Free the shared memory block.
+        """
+        from multiprocessing import shared_memory
+
+        shm = self._attached.pop(self.name, None)
+        if shm is None:
+            shm = shared_memory.SharedMemory(name=self.name)
+        shm.close()
+        shm.unlink()
+
+    def to_dict(self):
+        return {'handle': 'shm', 'name': self.name,
+                'shape': list(self.shape), 'dtype': self.dtype}
+
+
+_handles = {
+    'npy': NpyArray,
+    'netcdf': NetCDFVariable,
+    'shm': SharedArray
+}
+
+
+def figure_to_dict(figure, arrays='npy', array_dir=None, inline_max=1024):
+    """
+    Describe a CreateFigure, its CreatePlot objects and their layers
+    with plain python types that can be written to YAML/JSON, pickled
+    cheaply and sent to worker processes. Arrays larger than
+    inline_max elements are not embedded but referenced by a handle.
+
+    Args:
+        figure : (CreateFigure) figure to describe
+        arrays : (str; default='npy') how large arrays are stored:
+                 'npy' writes each array once to a .npy file in
+                 array_dir, named by a hash of its content, 'shm' copies
+                 it to shared memory and 'inline' embeds it
+        array_dir : (str; default=None) directory of the .npy files
+        inline_max : (int; default=1024) largest array embedded in the spec
+    Returns:
+        A dictionary with the 'figure' options and the 'plots'.
+    """
+    valid_arrays = ['npy', 'shm', 'inline']
+    if arrays not in valid_arrays:
+        raise ValueError(f'{arrays} is not a valid array storage. ' +
+                         f'Valid options are: {" | ".join(valid_arrays)}')
+    if arrays == 'npy' and array_dir is None:
+        raise ValueError("array_dir is required to store arrays as 'npy'")
+
+    def encode(value):
+        return _encode(value, arrays, array_dir, inline_max)
+
+    options = {option: encode(getattr(figure, option)) for option in _figure_options
+               if hasattr(figure, option)}
+    cache = getattr(figure, 'projection_cache', None)
+    options['projection_cache'] = None if cache is None else cache.cache_dir or True
+    templates = getattr(figure, 'map_templates', None)
+    options['map_templates'] = None if templates is None else templates.cache_dir or True
+    store = getattr(figure, 'feature_store', None)
+    options['feature_store'] = None if store is None else store.data_dir or True
+
+    plots = []
+    for plot in figure.plot_list:
+        layers = [{
+            'class': f'{type(layer).__module__}.{type(layer).__name__}',
+            'attributes': {k: encode(v) for k, v in vars(layer).items()}
+        } for layer in plot.plot_layers]
+        attributes = {k: encode(v) for k, v in vars(plot).items() if k != 'plot_layers'}
+        plots.append({'attributes': attributes, 'layers': layers})
+
+    return {'figure': options, 'plots': plots}
+
+
+def figure_from_dict(spec):
+    """
+    Create a CreateFigure from the output of figure_to_dict. Arrays
+    referenced by handle are loaded (or memory mapped) here.
+
+    Args:
+        spec : (dict) figure spec
+    Returns:
+        A CreateFigure ready for create_figure.
+    """
+    from emcpy.plots.create_plots import CreateFigure, CreatePlot
+
+    figure = CreateFigure(**{k: _decode(v) for k, v in spec['figure'].items()})
+
+    for plot_spec in spec['plots']:
+        layers = [_layer_from_dict(layer) for layer in plot_spec['layers']]
+        plot = CreatePlot(plot_layers=layers)
+        for key, value in plot_spec['attributes'].items():
+            setattr(plot, key, _decode(value))
+        figure.plot_list.append(plot)
+
+    return figure
+
+
+def to_yaml(figure, path=None, **kwargs):
+    """
+    Write the spec of a figure (or a spec dictionary) to YAML.
+
+    Args:
+        figure : (CreateFigure or dict) figure or spec
+        path : (str; default=None) output file; None returns the YAML
+        **kwargs : passed to figure_to_dict
+    Returns:
+        The YAML string when path is None.
+    """
+    import yaml
+
+    spec = figure if isinstance(figure, dict) else figure_to_dict(figure, **kwargs)
+    if path is None:
+        return yaml.safe_dump(spec, sort_keys=False)
+
+    with open(path, 'w') as f:
+        yaml.safe_dump(spec, f, sort_keys=False)
+
+
+def from_yaml(stream):
+    """
+    Read a figure spec from a YAML file path or string and create
+    the CreateFigure.
+    """
+    import yaml
+
+    if isinstance(stream, (str, os.PathLike)) and os.path.isfile(stream):
+        with open(stream) as f:
+            spec = yaml.safe_load(f)
+    else:
+        spec = yaml.safe_load(stream)
+
+    return figure_from_dict(spec)
+
+
+def spec_fingerprint(spec):
+    """
+    Hash of a figure spec, e.g. to skip rendering figures whose spec
+    has not changed. Arrays stored as 'npy' are named by their content
+    so the hash follows the data; arrays in netCDF files or shared
+    memory are only identified by their handle.
+    """
+    text = json.dumps(spec, sort_keys=True, default=str)
+
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def release(spec):
+    """
+    Free the shared memory blocks referenced by a spec.
+    """
+    for handle in _find_handles(spec):
+        if handle.get('handle') == 'shm':
+            SharedArray(handle['name'], handle['shape'], handle['dtype']).unlink()
+
+
+def _encode(value, arrays, array_dir, inline_max):
+    """
+    Convert a value to plain python types, replacing large arrays by
+    a handle.
+    """
+    if isinstance(value, np.ma.MaskedArray):
+        return {'__masked__': {
+            'data': _encode(value.filled(), arrays, array_dir, inline_max),
+            'mask': _encode(np.ma.getmaskarray(value), arrays, array_dir, inline_max)
+        }}
+
+    if isinstance(value, np.ndarray):
+        if arrays == 'inline' or value.size <= inline_max:
+            return {'__ndarray__': value.tolist(), 'dtype': value.dtype.str}
+        if arrays == 'shm':
+            return {'__array__': SharedArray.create(value).to_dict()}
+
+        value = np.ascontiguousarray(value)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{value.shape}{value.dtype.str}'.encode())
+        digest.update(value.data)
+        path = os.path.join(array_dir, f'{digest.hexdigest()}.npy')
+        if not os.path.exists(path):
+            os.makedirs(array_dir, exist_ok=True)
+            np.save(path, value)
+        return {'__array__': NpyArray(path).to_dict()}
+
+    if isinstance(value, np.generic):
+        return value.item()
+
+    if isinstance(value, dict):
+        return {str(k): _encode(v, arrays, array_dir, inline_max) for k, v in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [_encode(v, arrays, array_dir, inline_max) for v in value]
+
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+
+    raise TypeError(f'{type(value).__name__} values can not be stored in a figure spec')
+
+
+def _decode(value):
+    """
+    Convert a spec value back, loading arrays referenced by handle.
+    """
+    if isinstance(value, dict):
+        if '__array__' in value:
+            handle = dict(value['__array__'])
+            return _handles[handle.pop('handle')](**handle).load()
+        if '__ndarray__' in value:
+            return np.asarray(value['__ndarray__'], dtype=value['dtype'])
+        if '__masked__' in value:
+            return np.ma.MaskedArray(_decode(value['__masked__']['data']),
+                                     mask=_decode(value['__masked__']['mask']))
+        return {k: _decode(v) for k, v in value.items()}
+
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+
+    return value
+
+
+def _layer_from_dict(layer_spec):
+    """
+    Create a layer object without calling its constructor, which
+    would need (and recompute things from) the raw data.
+    """
+    module, name = layer_spec['class'].rsplit('.', 1)
+    if module not in _layer_modules:
+        raise ValueError(f'{layer_spec["class"]} is not a valid layer class. ' +
+                         f'Layers must come from: {" | ".join(_layer_modules)}')
+
+    cls = getattr(importlib.import_module(module), name)
+    layer = cls.__new__(cls)
+    for key, value in layer_spec['attributes'].items():
+        setattr(layer, key, _decode(value))
+
+    return layer
+
+
+def _find_handles(value):
+    """
+    Array handles referenced anywhere in a spec.
+    """
+    if isinstance(value, dict):
+        if '__array__' in value:
+            yield value['__array__']
+        else:
+            for v in value.values():
+                yield from _find_handles(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _find_handles(v)
@@ -0,0 +1,93 @@
+# This work developed by NOAA/NWS/EMC under the Apache 2.0 license.
+import hashlib
+
+import numpy as np
+
+from emcpy.plots.map_tools import _LRUDiskCache
+
+__all__ = ['MapTemplateCache']
+
+
+class MapTemplateCache(_LRUDiskCache):
+
+    def __init__(self, maxsize=16, cache_dir=None):
+        """
+        Cache of the static map background (coastlines, borders, states,
+        land, ...) of map plots. The features of a given projection,
+        extent, feature list and axes size in pixels are drawn once into
+        a transparent image, which later figures overlay in place of
+        the cartopy features, so only the data layers are drawn per
+        product. Images are kept in memory with least recently used
+        eviction and optionally stored on disk as .npy files shared by
+        processes and runs.
+
+        Args:
+            maxsize : (int; default=16) number of images kept in memory
+            cache_dir : (str; default=None) directory of the on-disk
+                        cache; None keeps the cache in memory only
+        """
+        super().__init__(maxsize, cache_dir)
+
+    def overlay(self, ax, features, draw, zorder=1.5, dpi=None):
+        """
+        Draw the features on ax from the cached background image,
+        rendering the image first if needed.
+
+        Args:
+            ax : (GeoAxes) map axes whose projection and extent are set
+            features : (list or dict) description of the features, part
+                       of the cache key
+            draw : (callable) draw(ax, features) adds the features to
+                   an axes; used to render the background image
+            zorder : (float; default=1.5) zorder of the image, the
+                     default zorder of cartopy features
+            dpi : (float; default=None) resolution the figure is saved
+                  at; None uses the figure dpi
+        Returns:
+            The AxesImage of the background.
+        """
+        if dpi is None:
+            dpi = ax.figure.dpi
+
+        # size of the axes once its aspect ratio is applied, in output pixels
+        ax.apply_aspect()
+        extent = tuple(float(e) for e in np.round(ax.get_extent(), 6))
+        bbox = ax.get_window_extent()
+        ratio = dpi / ax.figure.dpi
+        shape = (max(int(round(bbox.height * ratio)), 1),
+                 max(int(round(bbox.width * ratio)), 1))
+
+        key = hashlib.blake2b(repr((ax.projection.proj4_init, extent, features,
+                                    shape, dpi)).encode(), digest_size=16).hexdigest()
+        image = self._lookup(key, lambda: self._render(ax.projection, extent, features,
+                                                       draw, shape, dpi))
+
+        return ax.imshow(image, extent=extent, origin='upper',
+                         transform=ax.projection, zorder=zorder,
+                         interpolation='nearest')
+
+    def _render(self, projection, extent, features, draw, shape, dpi):
+        """
+        Draw the features alone on a transparent off-screen figure with
+        the size of the target axes and return its RGBA pixels.
+        """
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        height, width = shape
+        fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        canvas = FigureCanvasAgg(fig)
+        fig.patch.set_alpha(0.)
+
+        ax = fig.add_axes([0, 0, 1, 1], projection=projection)
+        ax.set_extent(extent, crs=projection)
+        ax.patch.set_alpha(0.)
+        ax.spines['geo'].set_visible(False)
+
+        draw(ax, features)
+        canvas.draw()
+
+        image = np.array(canvas.buffer_rgba())
+        image.flags.writeable = False
+
+        return image
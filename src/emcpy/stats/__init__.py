@@ -1 +1,4 @@
-from .stats import mstats, lregress, ttest, get_weights, get_weighted_mean, get_linear_regression, bootstrap
+from .stats import mstats, t_critical, lregress, ttest, ttest_from_summaries, IncrementalTTest, \
+    get_weights, get_weighted_mean, get_linear_regression, bootstrap
+from .accumulators import QuantileSketch, SummaryStats, MStatsAccumulator, HistogramAccumulator
+from .regional import domain_extent, domain_mask, WeightedMean, RegionalIndex
@@ -0,0 +1,739 @@
+# coding: utf-8 -*-
+
+'''
+accumulators.py contains streaming statistics accumulators that consume
+data in chunks (e.g. per level or per netCDF slab) instead of whole arrays
+'''
+
+__all__ = ['QuantileSketch', 'SummaryStats', 'MStatsAccumulator',
+           'HistogramAccumulator', 'moment_bins', 'bin_index']
+
+import numpy as _np
+
+
+class QuantileSketch:
+
+    def __init__(self, compression=500):
+        """
+        Approximate quantiles of a stream of values using a merging
+        t-digest. Values are summarized by weighted centroids whose
+        size shrinks towards the tails, so the memory used is bounded
+        by roughly `compression` centroids regardless of the number
+        of values seen.
+
+        Args:
+            compression : (int, default=500) controls the number of
+                          centroids kept; larger values are more accurate
+        """
+        self.compression = compression
+        self.means = _np.empty(0)
+        self.weights = _np.empty(0)
+        self.min = _np.inf
+        self.max = -_np.inf
+
+    @property
+    def count(self):
+        return self.weights.sum()
+
+    def update(self, values):
+        """
+        Add values to the sketch. NaNs are ignored.
+
+        Args:
+            values : (array like) values to add
+        """
+        values = _np.asarray(values, dtype=_np.float64).ravel()
+        values = values[~_np.isnan(values)]
+        if values.size == 0:
+            return
+
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._compress(_np.concatenate([self.means, values]),
+                       _np.concatenate([self.weights, _np.ones(values.size)]))
+
+    def quantile(self, q):
+        """
+        Estimate quantile(s) of the values added so far.
+
+        Args:
+            q : (float or array like) quantile(s) between 0 and 1
+        Returns:
+            The estimated quantile(s); NaN if the sketch is empty.
+        """
+        if self.weights.size == 0:
+            return _np.full(_np.shape(q), _np.nan)[()]
+
+        cum = _np.cumsum(self.weights)
+        total = cum[-1]
+        positions = _np.concatenate([[0.], (cum - self.weights / 2.) / total, [1.]])
+        values = _np.concatenate([[self.min], self.means, [self.max]])
+
+        return _np.interp(q, positions, values)
+
+    def median(self):
+        """
+        Estimate the median of the values added so far.
+        """
+        return self.quantile(0.5)
+
+    def merge(self, other):
+        """
+        Combine with another sketch, e.g. one built on another process.
+
+        Args:
+            other : (QuantileSketch) sketch to merge
+        Returns:
+            A new QuantileSketch summarizing the values of both sketches.
+        """
+        merged = QuantileSketch(max(self.compression, other.compression))
+        merged.min = min(self.min, other.min)
+        merged.max = max(self.max, other.max)
+        if self.weights.size or other.weights.size:
+            merged._compress(_np.concatenate([self.means, other.means]),
+                             _np.concatenate([self.weights, other.weights]))
+
+        return merged
+
+    def to_dict(self):
+        """
+        Serialize the sketch to a dictionary of plain python types.
+        """
+        return {
+            'compression': self.compression,
+            'means': self.means.tolist(),
+            'weights': self.weights.tolist(),
+            'min': float(self.min),
+            'max': float(self.max)
+        }
+
+    @classmethod
+    def from_dict(cls, sketch_dict):
+        """
+        Create a sketch from the output of `to_dict`.
+        """
+        sketch = cls(sketch_dict['compression'])
+        sketch.means = _np.asarray(sketch_dict['means'], dtype=_np.float64)
+        sketch.weights = _np.asarray(sketch_dict['weights'], dtype=_np.float64)
+        sketch.min = sketch_dict['min']
+        sketch.max = sketch_dict['max']
+
+        return sketch
+
+    def _compress(self, means, weights):
+        """
+        Merge sorted centroids into buckets of the k1 scale function
+        k(q) = compression / (2 pi) * arcsin(2q - 1).
+        """
+        order = _np.argsort(means, kind='stable')
+        means = means[order]
+        weights = weights[order]
+
+        cum = _np.cumsum(weights)
+        q = (cum - weights / 2.) / cum[-1]
+        k = self.compression / (2. * _np.pi) * _np.arcsin(2. * q - 1.)
+        bucket = _np.floor(k - k[0]).astype(_np.int64)
+
+        starts = _np.flatnonzero(_np.diff(bucket, prepend=-1))
+        self.weights = _np.add.reduceat(weights, starts)
+        self.means = _np.add.reduceat(means * weights, starts) / self.weights
+
+
+class SummaryStats:
+
+    _fields = ['count', 'nnan', 'mean', 'm2', 'min', 'max']
+
+    def __init__(self, count=0., nnan=0, mean=_np.nan, m2=0.,
+                 min=_np.inf, max=-_np.inf, sketch=None):
+        """
+        Mergeable summary of a sample: count, NaN count, mean, sum of
+        squared deviations (M2), min, max and an optional quantile sketch.
+        Moments may be scalars or arrays (e.g. per grid point) and are
+        combined exactly with `merge`, so partial summaries computed per
+        cycle, tile or MPI rank give the same global moments as the
+        concatenated raw data.
+
+        With weights, `count` is the sum of weights and the moments are
+        weighted (frequency weights).
+
+        Args:
+            count : (float or array) number (or weight) of valid values
+            nnan : (int or array) number of NaNs skipped
+            mean : (float or array) mean of valid values
+            m2 : (float or array) sum of squared deviations from the mean
+            min : (float or array) minimum of valid values
+            max : (float or array) maximum of valid values
+            sketch : (QuantileSketch; default=None) quantile sketch of
+                     the values, only kept for scalar summaries
+        """
+        self.count = count
+        self.nnan = nnan
+        self.mean = mean
+        self.m2 = m2
+        self.min = min
+        self.max = max
+        self.sketch = sketch
+
+    @classmethod
+    def from_array(cls, x, axis=None, weights=None, sketch=False,
+                   compression=500):
+        """
+        Summarize an array, skipping NaNs.
+
+        Args:
+            x : (array like) input data
+            axis : (int or tuple, default=None) axis to reduce over; None
+                   reduces over all elements
+            weights : (array like, default=None) weights broadcastable
+                      to x
+            sketch : (bool, default=False) also build a QuantileSketch;
+                     only valid when axis is None
+            compression : (int, default=500) compression of the sketch
+        Returns:
+            A SummaryStats of x.
+        """
+        x = _np.asarray(x, dtype=_np.float64)
+        valid = ~_np.isnan(x)
+        xz = _np.where(valid, x, 0.)
+
+        if weights is None:
+            count = valid.sum(axis=axis, dtype=_np.float64)
+            with _np.errstate(invalid='ignore', divide='ignore'):
+                mean = xz.sum(axis=axis) / count
+            expanded = mean if axis is None else _np.expand_dims(mean, axis)
+            dev = _np.where(valid, _np.subtract(x, expanded, out=xz), 0.)
+            m2 = _np.vdot(dev, dev) if axis is None else (dev * dev).sum(axis=axis)
+        else:
+            w = _np.where(valid, _np.broadcast_to(weights, x.shape), 0.)
+            count = w.sum(axis=axis)
+            with _np.errstate(invalid='ignore', divide='ignore'):
+                mean = (w * xz).sum(axis=axis) / count
+            expanded = mean if axis is None else _np.expand_dims(mean, axis)
+            dev = _np.where(valid, x - expanded, 0.)
+            m2 = (w * dev * dev).sum(axis=axis)
+
+        summary = cls(count=count,
+                      nnan=(~valid).sum(axis=axis),
+                      mean=mean,
+                      m2=m2,
+                      min=_np.min(x, axis=axis, where=valid, initial=_np.inf),
+                      max=_np.max(x, axis=axis, where=valid, initial=-_np.inf))
+
+        if sketch:
+            if axis is not None:
+                raise ValueError('A quantile sketch can only be built when ' +
+                                 'reducing over all elements (axis=None).')
+            summary.sketch = QuantileSketch(compression)
+            summary.sketch.update(x[valid])
+
+        return summary
+
+    def merge(self, other):
+        """
+        Combine with another summary using the parallel algorithm of
+        Chan et al. for the mean and M2.
+
+        Args:
+            other : (SummaryStats) summary to merge
+        Returns:
+            A new SummaryStats of both samples.
+        """
+        count = self.count + other.count
+        mean_a = _np.where(self.count > 0, self.mean, 0.)
+        mean_b = _np.where(other.count > 0, other.mean, 0.)
+        delta = mean_b - mean_a
+
+        with _np.errstate(invalid='ignore', divide='ignore'):
+            frac = _np.where(count > 0, other.count / count, 0.)
+            mean = _np.where(count > 0, mean_a + delta * frac, _np.nan)
+            m2 = self.m2 + other.m2 + delta * delta * self.count * frac
+
+        if self.sketch is not None and other.sketch is not None:
+            sketch = self.sketch.merge(other.sketch)
+        else:
+            sketch = self.sketch if other.sketch is None else other.sketch
+
+        return SummaryStats(count=count,
+                            nnan=self.nnan + other.nnan,
+                            mean=mean[()],
+                            m2=m2[()],
+                            min=_np.minimum(self.min, other.min),
+                            max=_np.maximum(self.max, other.max),
+                            sketch=sketch)
+
+    def update(self, x, axis=None, weights=None):
+        """
+        Add an array to the summary in place.
+
+        Args:
+            x : (array like) input data
+            axis : (int or tuple, default=None) axis to reduce over
+            weights : (array like, default=None) weights broadcastable to x
+        """
+        merged = self.merge(SummaryStats.from_array(x, axis=axis, weights=weights,
+                                                    sketch=self.sketch is not None))
+        self.__dict__.update(merged.__dict__)
+
+    def var(self, ddof=1):
+        """
+        Variance of the summarized sample.
+
+        Args:
+            ddof : (int, default=1) delta degrees of freedom
+        """
+        with _np.errstate(invalid='ignore', divide='ignore'):
+            return self.m2 / (self.count - ddof)
+
+    def std(self, ddof=1):
+        """
+        Standard deviation of the summarized sample.
+
+        Args:
+            ddof : (int, default=1) delta degrees of freedom
+        """
+        return _np.sqrt(self.var(ddof=ddof))
+
+    def to_dict(self):
+        """
+        Serialize the summary to a dictionary of plain python types,
+        e.g. to write to YAML/JSON or send between processes.
+        """
+        summary_dict = {field: _np.asarray(getattr(self, field)).tolist()
+                        for field in self._fields}
+        summary_dict['sketch'] = None if self.sketch is None else self.sketch.to_dict()
+
+        return summary_dict
+
+    @classmethod
+    def from_dict(cls, summary_dict):
+        """
+        Create a summary from the output of `to_dict`.
+        """
+        fields = {field: _np.asarray(summary_dict[field])[()] for field in cls._fields}
+        sketch = summary_dict.get('sketch')
+
+        return cls(**fields,
+                   sketch=None if sketch is None else QuantileSketch.from_dict(sketch))
+
+
+class MStatsAccumulator:
+
+    def __init__(self, approx_median=False, compression=500):
+        """
+        Accumulate the statistics reported by `mstats` over chunks of
+        data in a single pass. The moments are kept in a `SummaryStats`
+        so chunks never need to be concatenated, and accumulators built
+        on different processes can be combined with `merge`.
+
+        Args:
+            approx_median : (bool, default=False) estimate the median
+                            with a `QuantileSketch`. If False, the
+                            Median field is NaN.
+            compression : (int, default=500) compression of the
+                          quantile sketch
+        """
+        self.moments = SummaryStats(
+            sketch=QuantileSketch(compression) if approx_median else None)
+        self.nelements = 0
+        self.sumabs = 0.
+        self.minabs = _np.inf
+        self.nzero = 0
+        self.chunk_shape = None
+        self.nchunks = 0
+
+    def update(self, chunk):
+        """
+        Add a chunk of data to the accumulator.
+
+        Args:
+            chunk : (numpy array) real valued chunk of data, e.g. one
+                    level or one slab of a larger field; integer data
+                    is converted to float64 as in `mstats`
+        """
+        x = _np.asarray(chunk)
+        if not _np.issubdtype(x.dtype, _np.floating):
+            x = x.astype(_np.float64)
+
+        # keep track of chunk shapes to report MatrixSize
+        if self.nchunks == 0:
+            self.chunk_shape = x.shape
+        elif self.chunk_shape != x.shape:
+            self.chunk_shape = None
+        self.nchunks += 1
+        self.nelements += x.size
+
+        xf = x.ravel()
+        nanmask = _np.isnan(xf)
+        nnans = _np.count_nonzero(nanmask)
+        if nnans:
+            xf = xf[~nanmask]
+
+        n = xf.size
+        if n == 0:
+            self.moments.nnan += nnans
+            return
+
+        mean = xf.mean(dtype=_np.float64)
+        dev = xf - mean
+        chunk = SummaryStats(count=n, nnan=nnans, mean=mean,
+                             m2=_np.dot(dev, dev), min=xf.min(), max=xf.max())
+        del dev
+
+        if self.moments.sketch is not None:
+            chunk.sketch = QuantileSketch(self.moments.sketch.compression)
+            chunk.sketch.update(xf)
+        self.moments = self.moments.merge(chunk)
+
+        absxf = _np.abs(xf)
+        self.sumabs += absxf.sum(dtype=_np.float64)
+        self.minabs = min(self.minabs, _np.min(absxf, where=absxf > 0., initial=_np.inf))
+        self.nzero += n - _np.count_nonzero(xf)
+
+    def merge(self, other):
+        """
+        Combine with another accumulator, e.g. one built on another
+        MPI rank or for another tile. MatrixSize of the result stacks
+        the chunks of both accumulators.
+
+        Args:
+            other : (MStatsAccumulator) accumulator to merge
+        Returns:
+            A new MStatsAccumulator of both inputs.
+        """
+        merged = MStatsAccumulator()
+        merged.moments = self.moments.merge(other.moments)
+        merged.nelements = self.nelements + other.nelements
+        merged.sumabs = self.sumabs + other.sumabs
+        merged.minabs = min(self.minabs, other.minabs)
+        merged.nzero = self.nzero + other.nzero
+        merged.nchunks = self.nchunks + other.nchunks
+        if self.nchunks == 0 or other.nchunks == 0:
+            merged.chunk_shape = self.chunk_shape if other.nchunks == 0 else other.chunk_shape
+        elif self.chunk_shape == other.chunk_shape:
+            merged.chunk_shape = self.chunk_shape
+
+        return merged
+
+    def to_dict(self):
+        """
+        Serialize the accumulator to a dictionary of plain python types.
+        """
+        return {
+            'moments': self.moments.to_dict(),
+            'nelements': int(self.nelements),
+            'sumabs': float(self.sumabs),
+            'minabs': float(self.minabs),
+            'nzero': int(self.nzero),
+            'chunk_shape': None if self.chunk_shape is None else list(self.chunk_shape),
+            'nchunks': int(self.nchunks)
+        }
+
+    @classmethod
+    def from_dict(cls, acc_dict):
+        """
+        Create an accumulator from the output of `to_dict`.
+        """
+        acc = cls()
+        acc.moments = SummaryStats.from_dict(acc_dict['moments'])
+        acc.nelements = acc_dict['nelements']
+        acc.sumabs = acc_dict['sumabs']
+        acc.minabs = acc_dict['minabs']
+        acc.nzero = acc_dict['nzero']
+        chunk_shape = acc_dict['chunk_shape']
+        acc.chunk_shape = None if chunk_shape is None else tuple(chunk_shape)
+        acc.nchunks = acc_dict['nchunks']
+
+        return acc
+
+    def result(self):
+        """
+        Return the accumulated statistics with the same fields as
+        `mstats(verbose=False)`. MatrixSize stacks the chunk shape along
+        a new leading axis when all chunks have the same shape.
+
+        Returns:
+            OUT : (object) statistics of all data seen so far
+        """
+        OUT = type('', (), {})
+
+        moments = self.moments
+        count = moments.count
+
+        if self.chunk_shape is not None:
+            OUT.MatrixSize = (self.nchunks,) + tuple(self.chunk_shape)
+        else:
+            OUT.MatrixSize = (self.nelements,)
+        OUT.NElements = self.nelements
+        OUT.Nnans = moments.nnan
+        OUT.NAnalyzedElements = int(count)
+
+        with _np.errstate(invalid='ignore', divide='ignore'):
+            OUT.Mean = moments.mean
+            OUT.Max = moments.max if count else _np.nan
+            OUT.Min = moments.min if count else _np.nan
+            OUT.Median = moments.sketch.median() if moments.sketch is not None else _np.nan
+            OUT.StDev = moments.std(ddof=1) if count > 1 else _np.nan
+            OUT.MeanAbs = self.sumabs / count if count else _np.nan
+            OUT.MinAbs = self.minabs if _np.isfinite(self.minabs) else _np.nan
+            OUT.FracZero = self.nzero / count if count else _np.nan
+            OUT.FracNan = moments.nnan / self.nelements if self.nelements else _np.nan
+
+        return OUT
+
+
+def moment_bins(summary, eval_type='omf', nstd=4):
+    """
+    Histogram bins from the moments of a sample, following `calc_bins`:
+    the bin size is (max - min) / sqrt(count) and the bins span nstd
+    standard deviations around zero ('omf', 'oma') or the mean.
+
+    Args:
+        summary : (SummaryStats) scalar summary of the sample
+        eval_type : (str, default 'omf') options are 'omf', 'oma',
+                    'observation', 'hofx'
+        nstd : (int, default 4) number of standard deviations used to
+               determine the binning range
+    Returns:
+        bins : (numpy array) bin edges
+        binsize : (float) size of bins
+    """
+    binsize = (summary.max - summary.min) / _np.sqrt(summary.count)
+    std = summary.std(ddof=0)
+
+    if eval_type.lower() in ['omf', 'oma']:
+        center = 0.
+    else:
+        center = summary.mean
+
+    bins = _np.arange(center - nstd * std, center + nstd * std, binsize)
+
+    return bins, binsize
+
+
+def bin_index(x, edges, uniform=None):
+    """
+    Bin index of every value like `np.histogram`: bins are half open
+    except the last one, which includes the upper edge. Uniform bins
+    are indexed with arithmetic instead of a binary search.
+
+    Args:
+        x : (numpy array) values without NaNs
+        edges : (numpy array) increasing bin edges
+        uniform : (bool, default=None) whether the bins have the same
+                  width; None checks the edges
+    Returns:
+        idx : (numpy array) bin index of every value; -1 below the
+              first edge and nbins above the last
+    """
+    nbins = edges.size - 1
+    if uniform is None:
+        widths = _np.diff(edges)
+        uniform = _np.allclose(widths, widths[0], rtol=1e-9, atol=0.)
+
+    if not uniform:
+        idx = _np.searchsorted(edges, x, side='right') - 1
+        idx[x == edges[-1]] = nbins - 1
+        return _np.where(x > edges[-1], nbins, idx)
+
+    lo, hi = edges[0], edges[-1]
+    idx = _np.floor((x - lo) * (nbins / (hi - lo)))
+    idx = _np.clip(idx, -1, nbins).astype(_np.intp)
+    idx[x == hi] = nbins - 1
+
+    # correct for rounding so edges match np.histogram
+    inner = (idx >= 0) & (idx < nbins)
+    lower = inner & (x < edges[_np.clip(idx, 0, nbins)])
+    idx[lower] -= 1
+    upper = inner & ~lower & (x >= edges[_np.clip(idx + 1, 0, nbins)]) & (idx != nbins - 1)
+    idx[upper] += 1
+
+    return idx
+
+
+class HistogramAccumulator:
+
+    def __init__(self, bins=10, range=None):
+        """
+        Histogram filled chunk by chunk with `np.bincount`, so large
+        samples (e.g. tens of millions of radiance departures read per
+        file or per channel) never need to be concatenated. Values
+        outside the edges are counted in `underflow` and `overflow`,
+        and NaNs in `nnan`. Accumulators with the same edges built on
+        different processes can be combined with `merge`.
+
+        Args:
+            bins : (int or array like, default=10) number of uniform
+                   bins over range, or the bin edges
+            range : (tuple, default=None) (lower, upper) range of the
+                    bins; required when bins is an int
+        """
+        if _np.ndim(bins) == 0:
+            if range is None:
+                raise ValueError('range is required when bins is a number of bins. ' +
+                                 'Use HistogramAccumulator.from_moments to derive ' +
+                                 'the range from the data.')
+            edges = _np.linspace(range[0], range[1], int(bins) + 1)
+        else:
+            edges = _np.asarray(bins, dtype=_np.float64)
+
+        if edges.ndim != 1 or edges.size < 2 or _np.any(_np.diff(edges) <= 0):
+            raise ValueError('bin edges must be a 1-D increasing array of ' +
+                             'at least two values')
+
+        self.edges = edges
+        self.counts = _np.zeros(edges.size - 1)
+        self.underflow = 0.
+        self.overflow = 0.
+        self.nnan = 0
+        widths = _np.diff(edges)
+        self.uniform = _np.allclose(widths, widths[0], rtol=1e-9, atol=0.)
+
+    @classmethod
+    def from_moments(cls, summary, eval_type='omf', nstd=4):
+        """
+        Create an accumulator whose bins are derived from the moments of
+        the data, as `calc_bins` does for whole arrays. The summary is
+        typically built by a first pass of `SummaryStats.update` over
+        the chunks, or merged from per-file summaries.
+
+        Args:
+            summary : (SummaryStats) scalar summary of the data
+            eval_type : (str, default 'omf') see `moment_bins`
+            nstd : (int, default 4) see `moment_bins`
+        Returns:
+            An empty HistogramAccumulator.
+        """
+        bins, _ = moment_bins(summary, eval_type=eval_type, nstd=nstd)
+
+        return cls(bins=bins)
+
+    @classmethod
+    def from_chunks(cls, chunks, eval_type='omf', nstd=4):
+        """
+        Build a histogram in two streaming passes: the first collects
+        the moments used to derive the bins and the second fills the
+        counts.
+
+        Args:
+            chunks : (iterable or callable) re-iterable collection of
+                     arrays (e.g. a list of netCDF variables), or a
+                     function returning a new iterator on each call
+            eval_type : (str, default 'omf') see `moment_bins`
+            nstd : (int, default 4) see `moment_bins`
+        Returns:
+            A filled HistogramAccumulator.
+        """
+        def _chunks():
+            return chunks() if callable(chunks) else iter(chunks)
+
+        summary = SummaryStats()
+        for chunk in _chunks():
+            summary.update(chunk)
+
+        hist = cls.from_moments(summary, eval_type=eval_type, nstd=nstd)
+        for chunk in _chunks():
+            hist.update(chunk)
+
+        return hist
+
+    @property
+    def centers(self):
+        return 0.5 * (self.edges[1:] + self.edges[:-1])
+
+    @property
+    def total(self):
+        return self.counts.sum() + self.underflow + self.overflow
+
+    def update(self, chunk, weights=None):
+        """
+        Add a chunk of data to the histogram. Bins are half open except
+        the last one, which includes the upper edge, like `np.histogram`.
+
+        Args:
+            chunk : (array like) data
+            weights : (array like, default=None) weights of the same
+                      shape as chunk
+        """
+        x = _np.asarray(chunk, dtype=_np.float64).ravel()
+        w = None if weights is None else _np.asarray(weights, dtype=_np.float64).ravel()
+
+        valid = ~_np.isnan(x)
+        nnans = x.size - _np.count_nonzero(valid)
+        if nnans:
+            self.nnan += nnans
+            x = x[valid]
+            w = None if w is None else w[valid]
+
+        idx = self._bin_index(x)
+        nbins = self.counts.size
+        below = idx < 0
+        above = idx >= nbins
+        self.underflow += below.sum() if w is None else w[below].sum()
+        self.overflow += above.sum() if w is None else w[above].sum()
+
+        inside = ~(below | above)
+        self.counts += _np.bincount(idx[inside], minlength=nbins,
+                                    weights=None if w is None else w[inside])
+
+    def merge(self, other):
+        """
+        Combine with another accumulator that has the same bin edges.
+
+        Args:
+            other : (HistogramAccumulator) accumulator to merge
+        Returns:
+            A new HistogramAccumulator of both inputs.
+        """
+        if self.edges.shape != other.edges.shape or not _np.allclose(self.edges, other.edges):
+            raise ValueError('Only histograms with the same bin edges can be merged.')
+
+        merged = HistogramAccumulator(bins=self.edges)
+        merged.counts = self.counts + other.counts
+        merged.underflow = self.underflow + other.underflow
+        merged.overflow = self.overflow + other.overflow
+        merged.nnan = self.nnan + other.nnan
+
+        return merged
+
+    def to_dict(self):
+        """
+        Serialize the accumulator to a dictionary of plain python types.
+        """
+        return {
+            'edges': self.edges.tolist(),
+            'counts': self.counts.tolist(),
+            'underflow': float(self.underflow),
+            'overflow': float(self.overflow),
+            'nnan': int(self.nnan)
+        }
+
+    @classmethod
+    def from_dict(cls, hist_dict):
+        """
+        Create an accumulator from the output of `to_dict`.
+        """
+        hist = cls(bins=hist_dict['edges'])
+        hist.counts = _np.asarray(hist_dict['counts'], dtype=_np.float64)
+        hist.underflow = hist_dict['underflow']
+        hist.overflow = hist_dict['overflow']
+        hist.nnan = hist_dict['nnan']
+
+        return hist
+
+    def to_histogram(self):
+        """
+        Create an `emcpy.plots.plots.Histogram` layer of the counts.
+
+        Returns:
+            A Histogram plotting the accumulated counts.
+        """
+        from emcpy.plots.plots import Histogram
+
+        return Histogram.from_counts(self.edges, self.counts)
+
+    def _bin_index(self, x):
+        """
+        Bin index of every value; -1 below the first edge and nbins
+        above the last.
+        """
+        return bin_index(x, self.edges, uniform=self.uniform)
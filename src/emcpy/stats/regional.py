@@ -0,0 +1,363 @@
+# coding: utf-8 -*-
+
+'''
+regional.py contains area weighted and regional statistics on
+latitude/longitude grids
+'''
+
+__all__ = ['domain_extent', 'domain_mask', 'WeightedMean', 'RegionalIndex']
+
+import numpy as _np
+from emcpy.stats.stats import get_weights
+
+
+def domain_extent(domain):
+    '''
+    Return the (lon_min, lon_max, lat_min, lat_max) extent of a domain.
+
+    Args:
+        domain : (str, tuple or Domain) name of a domain in
+                 `emcpy.plots.map_tools.Domain.map_domains`, a
+                 (name, dd) tuple for custom domains, a Domain object
+                 or an extent tuple of four numbers
+    Returns:
+        The extent of the domain as a tuple.
+    '''
+    if hasattr(domain, 'extent'):
+        return tuple(domain.extent)
+
+    if isinstance(domain, (tuple, list)) and len(domain) == 4:
+        return tuple(domain)
+
+    from emcpy.plots.map_tools import Domain
+
+    if isinstance(domain, (tuple, list)):
+        return tuple(Domain(domain=domain[0], dd=domain[1]).extent)
+
+    return tuple(Domain(domain).extent)
+
+
+def domain_mask(lats, lons, domain, halo=0.):
+    '''
+    Boolean mask of the points that fall within a domain. Longitudes
+    may be given in [-180, 180) or [0, 360) and domains that cross the
+    dateline are handled. lats and lons are broadcast against each
+    other, so a regular grid can be passed as `lats[:, None]` and
+    `lons[None, :]`.
+
+    Args:
+        lats : (array like) latitudes
+        lons : (array like) longitudes
+        domain : (str, tuple or Domain) domain, see `domain_extent`
+        halo : (float, default=0) margin in degrees added around the
+               domain extent
+    Returns:
+        A boolean array of the broadcast shape of lats and lons.
+    '''
+    lon_min, lon_max, lat_min, lat_max = domain_extent(domain)
+    lats = _np.asarray(lats)
+    lons = _np.asarray(lons)
+
+    lat_ok = (lats >= lat_min - halo) & (lats <= lat_max + halo)
+
+    if lon_max - lon_min + 2. * halo >= 360.:
+        return lat_ok & _np.ones(lons.shape, dtype=bool)
+
+    west = _wrap_lons(lon_min - halo)
+    east = _wrap_lons(lon_max + halo)
+    lons = _wrap_lons(lons)
+    if west <= east:
+        lon_ok = (lons >= west) & (lons <= east)
+    else:
+        # domain crosses the dateline
+        lon_ok = (lons >= west) | (lons <= east)
+
+    return lat_ok & lon_ok
+
+
+def _wrap_lons(lons):
+    '''
+    Wrap longitudes into [-180, 180).
+    '''
+    return (_np.asarray(lons) + 180.) % 360. - 180.
+
+
+class WeightedMean:
+
+    def __init__(self, lats, lons=None):
+        '''
+        Area (cos latitude) weighted means over the trailing grid
+        dimensions of data. The weights are computed once per grid and
+        combined with each region mask once, so data never needs to be
+        paired with a full-shape weights array. NaNs and masked values
+        are left out and the remaining weights renormalized.
+
+        Args:
+            lats : (array like) latitudes. A 1-D array describes a
+                   regular grid whose data has trailing dimensions
+                   (nlat, nlon); otherwise lats has the shape of the
+                   trailing grid dimensions of the data (curvilinear
+                   grids, cubed-sphere tiles).
+            lons : (array like, default=None) longitudes, 1-D for a
+                   regular grid or the shape of lats. Required for
+                   regions.
+        '''
+        lats = _np.asarray(lats)
+        lons = None if lons is None else _np.asarray(lons)
+        self.regular = lats.ndim == 1 and (lons is None or lons.ndim == 1)
+
+        if self.regular:
+            self.lats = lats[:, _np.newaxis]
+            self.lons = None if lons is None else lons[_np.newaxis, :]
+            nlon = 1 if lons is None else lons.size
+            self.grid_shape = (lats.size, nlon)
+        else:
+            self.lats = lats
+            self.lons = lons
+            self.grid_shape = lats.shape
+
+        # 1-D latitude weights for regular grids, broadcast on use
+        self.lat_weights = get_weights(self.lats)
+        self._region_weights = {}
+        self._region_masks = {}
+
+    @property
+    def regions(self):
+        return list(self._region_masks.keys())
+
+    def add_region(self, name, domain=None, halo=0.):
+        '''
+        Precompute the mask of a named region.
+
+        Args:
+            name : (str) name of the region
+            domain : (str, tuple or Domain; default=name) domain whose
+                     extent defines the region, see `domain_extent`
+            halo : (float, default=0) margin in degrees around the extent
+        '''
+        if self.lons is None:
+            raise ValueError('longitudes are required to define regions')
+
+        domain = name if domain is None else domain
+        self._region_masks[name] = domain_mask(self.lats, self.lons, domain, halo=halo)
+        self._region_weights.pop(name, None)
+
+    def mask(self, region):
+        '''
+        Boolean grid mask of a region added with `add_region`.
+        '''
+        return self._region_masks[region]
+
+    def mean(self, data, region=None):
+        '''
+        Weighted mean over the trailing grid dimensions of data.
+
+        Args:
+            data : (numpy array or masked array) data whose trailing
+                   dimensions are the grid
+            region : (str, default=None) name of a region added with
+                     `add_region`; None averages over the whole grid
+        Returns:
+            The weighted mean with the leading (non-grid) dimensions
+            of data.
+        '''
+        return self._reduce(data, self._weights(region)[..., _np.newaxis])[..., 0]
+
+    def means(self, fields, regions=None):
+        '''
+        Weighted means of many fields over many regions. Each field is
+        read once: all regions are reduced together with a single
+        matrix product.
+
+        Args:
+            fields : (dict) name to data array
+            regions : (list, default=None) region names; None uses the
+                      whole grid and every region added so far
+        Returns:
+            A dictionary {field: {region: mean}}; the whole grid is
+            reported under the key None.
+        '''
+        if regions is None:
+            regions = [None] + self.regions
+
+        weights = _np.stack([self._weights(region) for region in regions], axis=-1)
+
+        out = {}
+        for field, data in fields.items():
+            result = self._reduce(data, weights)
+            out[field] = {region: result[..., i] for i, region in enumerate(regions)}
+
+        return out
+
+    def _weights(self, region):
+        '''
+        Grid shaped weights of a region, computed once and cached.
+        '''
+        if region not in self._region_weights:
+            weights = _np.broadcast_to(self.lat_weights, self.grid_shape)
+            if region is not None:
+                weights = _np.where(self._region_masks[region], weights, 0.)
+            self._region_weights[region] = _np.ascontiguousarray(weights)
+
+        return self._region_weights[region]
+
+    def _reduce(self, data, weights):
+        '''
+        Contract the trailing grid dimensions of data with weights of
+        shape grid_shape + (nregions,).
+        '''
+        ngrid = len(self.grid_shape)
+        if _np.ma.isMaskedArray(data):
+            data = data.filled(_np.nan)
+        data = _np.asarray(data)
+
+        if data.shape[data.ndim - ngrid:] != self.grid_shape:
+            raise ValueError(f'trailing dimensions of data {data.shape} do not '
+                             f'match the grid {self.grid_shape}')
+
+        valid = ~_np.isnan(data)
+        with _np.errstate(invalid='ignore', divide='ignore'):
+            if valid.all():
+                return _np.tensordot(data, weights, axes=ngrid) / weights.sum(axis=tuple(range(ngrid)))
+
+            total = _np.tensordot(_np.where(valid, data, 0.), weights, axes=ngrid)
+            norm = _np.tensordot(valid.astype(weights.dtype), weights, axes=ngrid)
+
+            return total / norm
+
+
+class RegionalIndex:
+
+    def __init__(self, lats, lons, domains=None, halo=0., weighted=True):
+        '''
+        Spatial index of the grid points that fall in each domain. The
+        index sets are computed once per grid, after which statistics
+        for every region of many fields only need one gather per region
+        instead of re-masking the lat/lon arrays.
+
+        Args:
+            lats : (array like) latitudes, 1-D for a regular grid or the
+                   shape of the grid (curvilinear grids, FV3 cubed-sphere
+                   tiles of shape (ny, nx, 6), ...)
+            lons : (array like) longitudes, 1-D for a regular grid or the
+                   shape of lats
+            domains : (list or dict, default=None) domain names (or
+                      (name, dd) tuples for custom domains), or a
+                      dictionary of region name to domain. Defaults to
+                      every domain in Domain.map_domains except 'custom'.
+            halo : (float, default=0) margin in degrees around each extent
+            weighted : (bool, default=True) weight statistics by cos(lat)
+        '''
+        lats = _np.asarray(lats)
+        lons = _np.asarray(lons)
+        if lats.ndim == 1 and lons.ndim == 1:
+            lats, lons = lats[:, _np.newaxis], lons[_np.newaxis, :]
+        self.grid_shape = _np.broadcast_shapes(lats.shape, lons.shape)
+
+        if domains is None:
+            from emcpy.plots.map_tools import Domain
+            domains = [name for name in Domain.map_domains if name != 'custom']
+        if not isinstance(domains, dict):
+            domains = {domain[0] if isinstance(domain, (tuple, list)) else domain: domain
+                       for domain in domains}
+
+        flat_lats = _np.broadcast_to(lats, self.grid_shape).ravel()
+        self.index = {}
+        self.weights = {}
+        for name, domain in domains.items():
+            idx = _np.flatnonzero(domain_mask(lats, lons, domain, halo=halo))
+            self.index[name] = idx
+            self.weights[name] = get_weights(flat_lats[idx]) if weighted else _np.ones(idx.size)
+
+    @property
+    def regions(self):
+        return list(self.index.keys())
+
+    def gather(self, field, region):
+        '''
+        Values of field at the points of a region.
+
+        Args:
+            field : (numpy array) data whose trailing dimensions are the grid
+            region : (str) region name
+        Returns:
+            An array of shape (..., npoints) with the leading dimensions
+            of field.
+        '''
+        return self._flatten(field)[..., self.index[region]]
+
+    def compute(self, field, reference=None, regions=None):
+        '''
+        Mean of a field per region and, given a reference (e.g. an
+        analysis or observations on the same grid), bias and RMSE of
+        field - reference. NaNs and masked values are left out.
+
+        Args:
+            field : (numpy array) data whose trailing dimensions are the grid
+            reference : (numpy array, default=None) reference of the
+                        same shape as field
+            regions : (list, default=None) regions to compute; None
+                      computes all regions
+        Returns:
+            A dictionary {region: {'count', 'mean'[, 'bias', 'rmse']}}.
+        '''
+        regions = self.regions if regions is None else regions
+        flat = self._flatten(field)
+        flat_ref = None if reference is None else self._flatten(reference)
+
+        out = {}
+        for region in regions:
+            idx = self.index[region]
+            weights = self.weights[region]
+            values = flat[..., idx]
+            valid = ~_np.isnan(values)
+            if flat_ref is not None:
+                diff = values - flat_ref[..., idx]
+                valid &= ~_np.isnan(diff)
+
+            w = _np.where(valid, weights, 0.)
+            norm = w.sum(axis=-1)
+            with _np.errstate(invalid='ignore', divide='ignore'):
+                stats = {
+                    'count': valid.sum(axis=-1),
+                    'mean': (w * _np.where(valid, values, 0.)).sum(axis=-1) / norm
+                }
+                if flat_ref is not None:
+                    diff = _np.where(valid, diff, 0.)
+                    stats['bias'] = (w * diff).sum(axis=-1) / norm
+                    stats['rmse'] = _np.sqrt((w * diff * diff).sum(axis=-1) / norm)
+            out[region] = stats
+
+        return out
+
+    def compute_many(self, fields, references=None, regions=None):
+        '''
+        Run `compute` for many fields.
+
+        Args:
+            fields : (dict) name to data array
+            references : (dict, default=None) name to reference array
+                         for the fields that have one
+            regions : (list, default=None) regions to compute
+        Returns:
+            A dictionary {field: {region: stats}}.
+        '''
+        references = {} if references is None else references
+
+        return {name: self.compute(field, references.get(name), regions=regions)
+                for name, field in fields.items()}
+
+    def _flatten(self, field):
+        '''
+        Reshape field to (..., npoints) without copying when possible.
+        Masked values (e.g. netCDF fill values) become NaN.
+        '''
+        if _np.ma.isMaskedArray(field):
+            field = field.astype(_np.float64).filled(_np.nan)
+        field = _np.asarray(field)
+        ngrid = len(self.grid_shape)
+        if field.shape[field.ndim - ngrid:] != tuple(self.grid_shape):
+            raise ValueError(f'trailing dimensions of field {field.shape} do not '
+                             f'match the grid {self.grid_shape}')
+
+        return field.reshape(field.shape[:field.ndim - ngrid] + (-1,))
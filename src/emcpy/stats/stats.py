@@ -4,12 +4,12 @@
 stats.py contains statistics utility functions
 '''
 
-__all__ = ['mstats', 'lregress', 'ttest', 'get_weights', 'get_weighted_mean',
-           'get_linear_regression', 'bootstrap']
+__all__ = ['mstats', 't_critical', 'lregress', 'ttest', 'ttest_from_summaries', 'IncrementalTTest',
+           'get_weights', 'get_weighted_mean', 'get_linear_regression', 'bootstrap']
 
+import functools as _functools
 import numpy as _np
-from scipy.stats import t as _t
-from sklearn.linear_model import LinearRegression
+from emcpy.stats.accumulators import SummaryStats, moment_bins
 
 
 def mstats(x, verbose=True):
@@ -92,63 +92,153 @@ def mstats(x, verbose=True):
         return OUT
 
 
+@_functools.lru_cache(maxsize=4096)
+def _t_critical(ci, dof):
+    '''
+    Cached two-sided critical t-value for a single (ci, dof) pair.
+    '''
+    from scipy.stats import t
+
+    pval = 1.0 - (1.0 - ci / 100.0) / 2.0
+
+    return float(t.ppf(pval, dof))
+
+
+def t_critical(ci, dof):
+    '''
+    Two-sided critical value of the Student's t distribution for a
+    confidence interval percentage and degrees of freedom. Values are
+    memoized per (ci, dof) with least-recently-used eviction, so loops
+    over channels or regions only evaluate `scipy.stats.t.ppf` once per
+    distinct pair. Hits and misses are reported by
+    `t_critical.cache_info()` and the table is reset with
+    `t_critical.cache_clear()`.
+
+    Args:
+        ci : (float) confidence interval percentage
+        dof : (int or array like) degrees of freedom
+
+    Returns:
+        The critical t-value (float), or an array of the shape of dof.
+    '''
+    if _np.ndim(dof) == 0:
+        return _t_critical(float(ci), float(dof))
+
+    dof = _np.asarray(dof)
+    unique_dof, inverse = _np.unique(dof, return_inverse=True)
+    tcrit = _np.array([_t_critical(float(ci), float(d)) for d in unique_dof])
+
+    return tcrit[inverse].reshape(dof.shape)
+
+
+t_critical.cache_info = _t_critical.cache_info
+t_critical.cache_clear = _t_critical.cache_clear
+
+
 def lregress(x, y, ci=95.0):
     '''
     Function that computes the linear regression between two variables and
     returns the regression coefficient and statistical significance
     for a t-value at a desired confidence interval.
 
+    y may hold many series along its trailing dimensions (e.g. a time
+    series at every grid point), in which case all regressions are
+    computed at once with broadcasted moments. Samples where x or y is
+    NaN are masked separately for each series.
+
     Args:
-        x : (array like) independent variable
-        y : (array like) dependent variable
+        x : (array like) independent variable of shape (n,)
+        y : (array like) dependent variable of shape (n,) or (n, ...)
         ci : (float, optional, default=95) confidence interval percentage
 
     Returns:
-        The linear regression coefficient (float),
-        the standard error on the linear regression coefficient (float),
-        and the statistical signficance of the linear regression
-        coefficient (bool).
+        The linear regression coefficient (float or array),
+        the standard error on the linear regression coefficient (float
+        or array), and the statistical signficance of the linear
+        regression coefficient (bool or bool array).
     '''
 
+    x = _np.asarray(x, dtype=_np.float64)
+    y = _np.asarray(y, dtype=_np.float64)
+
     # make sure the two samples are of the same size
     if (len(x) != len(y)):
         raise ValueError('samples x and y are not of the same size')
-    else:
-        nsamp = len(x)
 
-    pval = 1.0 - (1.0 - ci / 100.0) / 2.0
-    tcrit = _t.ppf(pval, 2 * len(x) - 2)
-
-    covmat = _np.cov(x, y=y, ddof=1)
-    cov_xx = covmat[0, 0]
-    cov_yy = covmat[1, 1]
-    cov_xy = covmat[0, 1]
-
-    # regression coefficient (rc)
-    rc = cov_xy / cov_xx
-    # total standard error squared (se)
-    se = (cov_yy - (rc**2) * cov_xx) * (nsamp - 1) / (nsamp - 2)
-    # standard error on rc (sb)
-    sb = _np.sqrt(se / (cov_xx * (nsamp - 1)))
+    x = x.reshape((-1,) + (1,) * (y.ndim - 1))
+    valid = ~(_np.isnan(x) | _np.isnan(y))
+    nsamp = valid.sum(axis=0)
+
+    with _np.errstate(invalid='ignore', divide='ignore'):
+        xmean = _np.where(valid, x, 0.).sum(axis=0) / nsamp
+        ymean = _np.where(valid, y, 0.).sum(axis=0) / nsamp
+        dx = _np.where(valid, x - xmean, 0.)
+        dy = _np.where(valid, y - ymean, 0.)
+
+        cov_xx = (dx * dx).sum(axis=0) / (nsamp - 1)
+        cov_yy = (dy * dy).sum(axis=0) / (nsamp - 1)
+        cov_xy = (dx * dy).sum(axis=0) / (nsamp - 1)
+
+        # regression coefficient (rc)
+        rc = cov_xy / cov_xx
+        # total standard error squared (se)
+        se = (cov_yy - (rc**2) * cov_xx) * (nsamp - 1) / (nsamp - 2)
+        # standard error on rc (sb)
+        sb = _np.sqrt(se / (cov_xx * (nsamp - 1)))
+
+    tcrit = t_critical(ci, 2 * nsamp - 2)
+
     # error bar on rc
     eb = tcrit * sb
 
-    ssig = True if (_np.abs(rc) - _np.abs(eb)) > 0.0 else False
+    ssig = (_np.abs(rc) - _np.abs(eb)) > 0.0
+
+    if y.ndim == 1:
+        return rc[()], sb[()], bool(ssig)
 
     return rc, sb, ssig
 
 
-def ttest(x, y=None, ci=95.0, paired=True, scale=False):
+def _ttest_slabs(x, y, chunk_size):
+    '''
+    Yield (x, y) slabs of cycles for `ttest`. Array-like inputs
+    (numpy arrays, netCDF4 variables, ...) are sliced along the sample
+    axis so only one slab is read at a time; any other iterable is
+    assumed to already yield slabs.
+    '''
+    if hasattr(x, 'shape'):
+        if chunk_size is None:
+            chunk_size = max(1, 2**20 // max(int(_np.prod(x.shape[1:])), 1))
+        for start in range(0, x.shape[0], chunk_size):
+            stop = start + chunk_size
+            yield x[start:stop], None if y is None else y[start:stop]
+    elif y is None:
+        for xslab in x:
+            yield xslab, None
+    else:
+        for xslab, yslab in zip(x, y):
+            yield xslab, yslab
+
+
+def ttest(x, y=None, ci=95.0, paired=True, scale=False, chunk_size=None):
     '''
     Given two samples, perform the Student's t-test and return the errorbar.
     The test assumes the sample size be the same between x and y.
+
+    The means and variances are accumulated in a single pass over
+    slabs of the sample (first) axis, so no full-size copies or
+    difference arrays are allocated. x and y may also be iterables of
+    slabs (e.g. a generator reading one set of cycles at a time).
     Args:
-        x: (numpy array) control
-        y: (numpy array, optional, default=x )experiment
+        x: (numpy array or iterable of arrays) control
+        y: (numpy array or iterable of arrays, optional, default=x )experiment
         ci: (float, optional, default=95) confidence interval percentage
         paired: (bool, optional, default=True) paired t-test
         scale: (bool, optional, default=False) normalize with mean(x) and
                return as a percentage
+        chunk_size: (int, optional, default=None) number of samples per
+                    slab when x is array-like; by default slabs hold about
+                    a million values
 
     Returns:
         The (normalized) difference in the sample means and
@@ -158,39 +248,184 @@ def ttest(x, y=None, ci=95.0, paired=True, scale=False):
     `diffmask = numpy.ma.masked_where(numpy.abs(diffmean)
                                       <=errorbar,diffmean).mask`
     '''
+    xstats = SummaryStats()
+    ystats = None if y is None else SummaryStats()
+    dstats = None if y is None or not paired else SummaryStats()
 
-    nsamp = x.shape[0]
+    for xslab, yslab in _ttest_slabs(x, y, chunk_size):
+        xslab = _np.asarray(xslab)
+        xstats = xstats.merge(SummaryStats.from_array(xslab, axis=0))
+        if yslab is not None:
+            yslab = _np.asarray(yslab)
+            ystats = ystats.merge(SummaryStats.from_array(yslab, axis=0))
+            if paired:
+                dstats = dstats.merge(SummaryStats.from_array(yslab - xslab, axis=0))
 
-    if y is None:
-        y = x.copy()
+    return ttest_from_summaries(xstats, ystats, dstats, ci=ci,
+                                paired=paired, scale=scale)
 
-    pval = 1.0 - (1.0 - ci / 100.0) / 2.0
-    tcrit = _t.ppf(pval, 2*(nsamp-1))
 
-    xmean = _np.nanmean(x, axis=0)
-    ymean = _np.nanmean(y, axis=0)
+def ttest_from_summaries(x, y=None, diff=None, ci=95.0, paired=True, scale=False):
+    '''
+    Perform the Student's t-test of `ttest` from `SummaryStats` of the
+    control, experiment and paired differences, each reduced over the
+    sample axis (`SummaryStats.from_array(x, axis=0)`). Summaries of
+    partial samples (e.g. per node or per set of cycles) can be merged
+    with `SummaryStats.merge` before calling this function.
+    Args:
+        x: (SummaryStats) control
+        y: (SummaryStats, optional, default=x) experiment
+        diff: (SummaryStats, optional) paired differences y-x; required
+              for the paired t-test when y is given
+        ci: (float, optional, default=95) confidence interval percentage
+        paired: (bool, optional, default=True) paired t-test
+        scale: (bool, optional, default=False) normalize with mean(x) and
+               return as a percentage
+
+    Returns:
+        The (normalized) difference in the sample means and
+        the (normalized) errorbar with respect to control.
+    '''
+    # number of samples including NaNs, as in ttest
+    nsamp = _np.max(x.count + x.nnan)
+
+    if y is None:
+        y = x
+        diff = SummaryStats(count=x.count, nnan=x.nnan,
+                            mean=_np.zeros_like(x.mean), m2=_np.zeros_like(x.m2))
+    elif paired and diff is None:
+        raise ValueError('the paired t-test requires the summary of y-x')
+
+    tcrit = t_critical(ci, 2*(nsamp-1))
 
-    diffmean = ymean - xmean
+    diffmean = y.mean - x.mean
 
     if paired:
         # paired t-test
-        std_err = _np.sqrt(_np.nanvar(y-x, axis=0, ddof=1) / nsamp)
+        std_err = _np.sqrt(diff.var(ddof=1) / nsamp)
     else:
         # unpaired t-test
-        std_err = _np.sqrt((_np.nanvar(x, axis=0, ddof=1) +
-                            _np.nanvar(y, axis=0, ddof=1)) / (nsamp-1.))
+        std_err = _np.sqrt((x.var(ddof=1) + y.var(ddof=1)) / (nsamp-1.))
 
     errorbar = tcrit * std_err
 
     # normalize (rescale) the diffmean and errorbar
     if scale:
-        scale_fac = 100.0 / xmean
+        scale_fac = 100.0 / x.mean
         diffmean = diffmean * scale_fac
         errorbar = errorbar * scale_fac
 
     return diffmean, errorbar
 
 
+class IncrementalTTest:
+
+    _summaries = ['x', 'y', 'diff']
+
+    def __init__(self, ci=95.0, paired=True, scale=False):
+        '''
+        Student's t-test of `ttest` accumulated one forecast cycle at a
+        time. Running summaries of the control, experiment and paired
+        differences are kept, so adding a cycle costs the size of one
+        cycle rather than a pass over the full archive.
+
+        Args:
+            ci: (float, optional, default=95) confidence interval percentage
+            paired: (bool, optional, default=True) paired t-test
+            scale: (bool, optional, default=False) normalize with mean(x) and
+                   return as a percentage
+        '''
+        self.ci = ci
+        self.paired = paired
+        self.scale = scale
+
+        self.x = SummaryStats()
+        self.y = SummaryStats()
+        self.diff = SummaryStats()
+
+    @property
+    def ncycles(self):
+        '''
+        Number of cycles added so far.
+        '''
+        return int(_np.max(self.x.count + self.x.nnan))
+
+    def update(self, x_cycle, y_cycle=None):
+        '''
+        Add a single cycle.
+        Args:
+            x_cycle: (numpy array) control for one cycle
+            y_cycle: (numpy array, optional, default=x_cycle) experiment
+                     for one cycle
+        '''
+        x_cycle = _np.asarray(x_cycle)[_np.newaxis]
+        y_cycle = x_cycle if y_cycle is None else _np.asarray(y_cycle)[_np.newaxis]
+
+        self._add(x_cycle, y_cycle)
+
+    def extend(self, x, y=None, chunk_size=None):
+        '''
+        Add several cycles at once, e.g. to initialize from an archive.
+        Args:
+            x: (numpy array or iterable of arrays) control with cycles
+               along the first axis
+            y: (numpy array or iterable of arrays, optional, default=x)
+               experiment with cycles along the first axis
+            chunk_size: (int, optional, default=None) number of cycles
+                        per slab when x is array-like
+        '''
+        for xslab, yslab in _ttest_slabs(x, y, chunk_size):
+            xslab = _np.asarray(xslab)
+            self._add(xslab, xslab if yslab is None else _np.asarray(yslab))
+
+    def result(self):
+        '''
+        Returns:
+            The (normalized) difference in the sample means and
+            the (normalized) errorbar with respect to control, as
+            returned by `ttest` for all cycles added so far.
+        '''
+        return ttest_from_summaries(self.x, self.y, self.diff, ci=self.ci,
+                                    paired=self.paired, scale=self.scale)
+
+    def save(self, filename):
+        '''
+        Persist the running state to a numpy .npz file.
+        Args:
+            filename: (str) output filename
+        '''
+        state = {'ci': self.ci, 'paired': self.paired, 'scale': self.scale}
+        for name in self._summaries:
+            for field in SummaryStats._fields:
+                state[f'{name}_{field}'] = getattr(getattr(self, name), field)
+
+        _np.savez(filename, **state)
+
+    @classmethod
+    def load(cls, filename):
+        '''
+        Restore a running state written by `save`.
+        Args:
+            filename: (str) .npz file written by `save`
+        '''
+        with _np.load(filename) as state:
+            obj = cls(ci=float(state['ci']), paired=bool(state['paired']),
+                      scale=bool(state['scale']))
+            for name in cls._summaries:
+                fields = {field: state[f'{name}_{field}'][()] for field in SummaryStats._fields}
+                setattr(obj, name, SummaryStats(**fields))
+
+        return obj
+
+    def _add(self, xslab, yslab):
+        '''
+        Merge a slab of cycles into the running summaries.
+        '''
+        self.x = self.x.merge(SummaryStats.from_array(xslab, axis=0))
+        self.y = self.y.merge(SummaryStats.from_array(yslab, axis=0))
+        self.diff = self.diff.merge(SummaryStats.from_array(yslab - xslab, axis=0))
+
+
 def get_weights(lats):
     '''
     Get weights for latitudes to do weighted mean
@@ -207,7 +442,9 @@ def get_weighted_mean(data, weights, axis=None):
     Given the weights for latitudes, compute weighted mean
     of data in that direction
     Note, `data` and `weights` must be same dimension
-    Uses `numpy.average`
+    Uses `numpy.average`. Partial weighted means that need to be
+    combined later (e.g. per tile or per MPI rank) can be kept as
+    `SummaryStats.from_array(data, axis=axis, weights=weights)`.
     Args:
         data: (numpy array) input data array
         weights: (numpy array) input weights
@@ -229,55 +466,230 @@ def get_linear_regression(x, y):
     in the dataset, and the targets predicted by the linear
     approximation.
 
+    The ordinary least squares solution is computed in closed form
+    from the sums of x, y, xy, x^2 and y^2. Pairs where x or y is NaN
+    are ignored. 2-D inputs of shape (n, k) are regressed column by
+    column, e.g. for many channels at once; an x of shape (n,) is
+    shared by all columns of y.
+
     Args:
-        y, x : (array like) Data to calculate linear regression
+        y, x : (array like) Data to calculate linear regression, of
+               shape (n,) or (n, k)
 
     Returns:
         The predicted y values from calculation,
         the R squared value, the intercept of the line, and the
         slope of the line from the equation for the predicted
-        y values.
+        y values. For 2-D inputs the R squared value, intercept and
+        slope are arrays of length k.
     """
-    x = x.reshape((-1, 1))
-    model = LinearRegression().fit(x, y)
-    r_sq = model.score(x, y)
-    intercept = model.intercept_
-    slope = model.coef_[0]
+    x = _np.asarray(x, dtype=_np.float64)
+    y = _np.asarray(y, dtype=_np.float64)
+    # samples are along the first axis, so a 1-D x pairs with the rows of y
+    if x.ndim == 1 and y.ndim == 2:
+        x = x[:, None]
+    x, y = _np.broadcast_arrays(x, y)
+
+    valid = ~(_np.isnan(x) | _np.isnan(y))
+    # shift by the first sample to limit cancellation in the sums
+    x0 = _np.where(valid[0], x[0], 0.)
+    y0 = _np.where(valid[0], y[0], 0.)
+    xs = _np.where(valid, x - x0, 0.)
+    ys = _np.where(valid, y - y0, 0.)
+
+    n = valid.sum(axis=0)
+    sx = xs.sum(axis=0)
+    sy = ys.sum(axis=0)
+    sxx = _np.einsum('i...,i...->...', xs, xs)
+    syy = _np.einsum('i...,i...->...', ys, ys)
+    sxy = _np.einsum('i...,i...->...', xs, ys)
+
+    with _np.errstate(invalid='ignore', divide='ignore'):
+        cov_xy = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+
+        # a constant x is fitted by the mean of y, as least squares
+        # with a minimum norm solution does
+        slope = _np.where(var_x > 0., cov_xy / var_x, 0.)
+        intercept = (y0 + sy / n) - slope * (x0 + sx / n)
+        # a constant y is fitted perfectly
+        r_sq = _np.where(var_y > 0., _np.where(var_x > 0., cov_xy**2 / (var_x * var_y), 0.), 1.)
+
     # This is the same as if you calculated y_pred
     # by y_pred = slope * x + intercept
-    y_pred = model.predict(x)
-    return y_pred, r_sq, intercept, slope
+    y_pred = slope * x + intercept
+
+    return y_pred, r_sq[()], intercept[()], slope[()]
+
+
+def _get_estimator(estimator):
+    """
+    Return the reduction function used for a bootstrap estimator.
+    Strings 'mean' and 'median' map to their numpy functions; a
+    callable is returned as is and must accept an `axis` keyword.
+    """
+    if callable(estimator):
+        return estimator
 
+    estimators = {
+        'mean': _np.mean,
+        'median': _np.median
+    }
 
-def bootstrap(insample, level=.95, estimator='mean', nrepl=10000):
+    try:
+        return estimators[estimator.lower()]
+    except KeyError:
+        raise ValueError(f'{estimator} is not a valid estimator. ' +
+                         'Current estimators supported are:\n' +
+                         f'{" | ".join(estimators.keys())} | callable')
+
+
+def _bootstrap_block(sample, func, nrepl, seedseq):
+    """
+    Draw `nrepl` replicates of `sample` from the stream seeded by
+    `seedseq` and return the estimator applied to each replicate.
+    """
+    rng = _np.random.default_rng(seedseq)
+    idx = rng.integers(0, sample.size, size=(nrepl, sample.size))
+
+    return func(sample[idx], axis=1)
+
+
+def _bootstrap_worker(shm_name, shape, dtype, estimator, blocks):
+    """
+    Process pool entry point for `bootstrap`. Attaches to the sample
+    held in shared memory and reduces the given list of
+    (nrepl, seedseq) blocks.
+    """
+    from multiprocessing.shared_memory import SharedMemory
+
+    shm = SharedMemory(name=shm_name)
+    try:
+        sample = _np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        func = _get_estimator(estimator)
+        boot_stats = [_bootstrap_block(sample, func, nb, ss) for nb, ss in blocks]
+        del sample
+    finally:
+        shm.close()
+
+    return _np.concatenate(boot_stats)
+
+
+def _bootstrap_parallel(sample, estimator, blocks, n_jobs, executor):
+    """
+    Reduce bootstrap blocks across a process pool. The sample is placed
+    in shared memory once instead of being pickled to every worker.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing.shared_memory import SharedMemory
+
+    shm = SharedMemory(create=True, size=max(sample.nbytes, 1))
+    own_executor = executor is None
+    try:
+        shared = _np.ndarray(sample.shape, dtype=sample.dtype, buffer=shm.buf)
+        shared[:] = sample
+        del shared
+
+        if own_executor:
+            executor = ProcessPoolExecutor(max_workers=n_jobs)
+
+        # group blocks into a bounded number of tasks; more tasks than
+        # workers keeps the pool busy when blocks are uneven
+        ntasks = min(len(blocks), 64)
+        tasks = [blocks[i::ntasks] for i in range(ntasks)]
+        futures = [executor.submit(_bootstrap_worker, shm.name, sample.shape,
+                                   sample.dtype, estimator, task) for task in tasks]
+
+        # put replicates back in block order so results do not depend
+        # on how blocks were distributed
+        boot_stats = [None] * len(blocks)
+        for i, future in enumerate(futures):
+            stats = future.result()
+            offset = 0
+            for j in range(i, len(blocks), ntasks):
+                nb = blocks[j][0]
+                boot_stats[j] = stats[offset:offset + nb]
+                offset += nb
+    finally:
+        if own_executor and executor is not None:
+            executor.shutdown()
+        shm.close()
+        shm.unlink()
+
+    return _np.concatenate(boot_stats)
+
+
+def bootstrap(insample, level=.95, estimator='mean', nrepl=10000,
+              seed=None, block_size=2**22, n_jobs=1, executor=None):
     """
     Generate emprical bootstrap confidence intervals.
     See https://ocw.mit.edu/courses/mathematics/
                 18-05-introduction-to-probability-and-statistics-spring-2014/
                 readings/MIT18_05S14_Reading24.pdf for more information.
 
+    Replicates are drawn in blocks of resampling indices and each block
+    is reduced as soon as it is drawn, so only one block of resamples is
+    held in memory at a time (per worker). Every block draws from its
+    own stream spawned from `seed`, so results for a given seed are the
+    same whether the blocks are reduced serially or in parallel.
+
     Args:
         insample: (array like) is the array from which the estimator (u)
                   was derived (x_1, x_2,....x_n).
         level: (float, default=0.95) desired confidence level for CI bounds
-        estimator: (char, default='mean') type of statistic obtained from
-                  the sample (mean or median)
-        nrepl: (integer, default=1000) number of replicates
+        estimator: (char or callable, default='mean') type of statistic
+                  obtained from the sample (mean or median), or a function
+                  such as `numpy.std` that accepts an `axis` keyword.
+                  Callables must be picklable when running in parallel.
+        nrepl: (integer, default=10000) number of replicates
+        seed: (int or numpy.random.SeedSequence, default=None) seed for
+              the random number generator; results are reproducible
+              for a given seed
+        block_size: (integer, default=2**22) maximum number of resampled
+                    values held in memory at once. At least one full
+                    replicate is always drawn per block.
+        n_jobs: (integer, default=1) number of worker processes used to
+                reduce the replicates; -1 uses all available cores
+        executor: (concurrent.futures.Executor, default=None) executor to
+                  submit work to instead of creating a process pool
 
     Returns:
         Lower and upper bounds of confidence intervals
     """
-    if any(_np.isnan(insample)):
+    insample = _np.asarray(insample).ravel()
+    nanmask = _np.isnan(insample)
+    if nanmask.any():
         print('bootstrap_ci.py: NaN detected. Dropping NaN(s) input prior to bootstrap...')
-        sample = insample[~_np.isnan(insample)]
+        sample = insample[~nanmask]
     else:
         sample = insample
 
-    boot_dist = [_np.random.choice(sample, _np.size(sample)) for x in _np.arange(nrepl)]
-    if estimator.lower() == 'mean':
-        deltas = _np.sort(_np.mean(boot_dist, axis=1) - _np.mean(sample))
-    elif estimator.lower() == 'median':
-        deltas = _np.sort(_np.median(boot_dist, axis=1) - _np.median(sample))
+    func = _get_estimator(estimator)
+
+    # split the replicates into at least a handful of blocks so they
+    # can be spread over workers; the layout only depends on the sample
+    # size, nrepl and block_size so it is the same for any n_jobs
+    nsamp = sample.size
+    nblock = max(1, min(block_size // max(nsamp, 1), -(-nrepl // 64)))
+    sizes = [min(nblock, nrepl - start) for start in range(0, nrepl, nblock)]
+    if not isinstance(seed, _np.random.SeedSequence):
+        seed = _np.random.SeedSequence(seed)
+    seeds = seed.spawn(len(sizes))
+    blocks = list(zip(sizes, seeds))
+
+    if n_jobs == -1:
+        import os
+        n_jobs = os.cpu_count()
+
+    if executor is not None or n_jobs > 1:
+        boot_stats = _bootstrap_parallel(sample, estimator, blocks,
+                                         n_jobs, executor)
+    else:
+        boot_stats = _np.concatenate([_bootstrap_block(sample, func, nb, ss)
+                                      for nb, ss in blocks])
+
+    deltas = boot_stats - func(sample)
 
     lower_pctile = 100*((1. - level)/2.)
     upper_pctile = 100. - lower_pctile
@@ -299,14 +711,6 @@ def calc_bins(data, eval_type='omf', nstd=4):
         bins: (int) number of bins
         binsize: (float) size of bins
     """
-    binsize = (_np.max(data) - _np.min(data))/_np.sqrt(len(data))
-
-    if eval_type.lower() == 'omf' or eval_type.lower() == 'oma':
-        start = 0 - (nstd * _np.std(data))
-        stop = 0 + (nstd * _np.std(data))
-    else:
-        start = _np.mean(data) - (nstd * _np.std(data))
-        stop = _np.mean(data) + (nstd * _np.std(data))
+    summary = SummaryStats.from_array(data)
 
-    bins = _np.arange(start, stop, binsize)
-    return bins, binsize
+    return moment_bins(summary, eval_type=eval_type, nstd=nstd)
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+import emcpy
+
+IMPORT_BUDGET = 1.0  # seconds
+
+
+def _run_python(code):
+    # run in a fresh interpreter so modules imported by other tests do not count
+    env = dict(os.environ)
+    src = os.path.dirname(os.path.dirname(emcpy.__file__))
+    env['PYTHONPATH'] = os.pathsep.join([src, env.get('PYTHONPATH', '')])
+    result = subprocess.run([sys.executable, '-c', code], env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def test_import_emcpy_is_lazy():
+    code = ('import sys, time\n'
+            't = time.perf_counter()\n'
+            'import emcpy\n'
+            'from emcpy.calcs.units import K_to_C\n'
+            'print(time.perf_counter() - t)\n'
+            'heavy = ["matplotlib", "cartopy", "scipy", "sklearn", "netCDF4"]\n'
+            'print(",".join(m for m in heavy if m in sys.modules) or "none")\n')
+    elapsed, loaded = _run_python(code)
+
+    assert loaded == 'none'
+    assert float(elapsed) < IMPORT_BUDGET
+
+
+def test_subpackages_load_on_access():
+    code = ('import sys\n'
+            'import emcpy\n'
+            'emcpy.stats.mstats\n'
+            'print("matplotlib" in sys.modules)\n'
+            'emcpy.io.netCDF.read_netCDF_var\n'
+            'print("netCDF4" in sys.modules)\n')
+    assert _run_python(code) == ['False', 'True']
+
+
+def test_submodules_load_on_access():
+    code = ('import emcpy\n'
+            'print(emcpy.plots.create_plots.CreateFigure.__name__)\n'
+            'print(emcpy.plots.map_tools.Domain.__name__)\n'
+            'print(emcpy.stats.accumulators.MStatsAccumulator.__name__)\n')
+    assert _run_python(code) == ['CreateFigure', 'Domain', 'MStatsAccumulator']
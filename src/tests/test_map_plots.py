@@ -1,8 +1,12 @@
+import pytest
 import numpy as np
 import matplotlib.pyplot as plt
 from emcpy.plots import CreatePlot, CreateFigure
-from emcpy.plots.map_tools import Domain, MapProjection
+from emcpy.plots.map_tools import Domain, MapProjection, ProjectionCache, superob, \
+    crop_grid, crop_points
 from emcpy.plots.map_plots import MapScatter, MapGridded, MapContour
+from emcpy.plots.templates import MapTemplateCache
+from emcpy.plots.features import FeatureStore, feature_scale
 
 
 def test_plot_global_map_no_features():
@@ -94,6 +98,343 @@ def test_plot_map_scatter_2D_conus():
     fig.save_figure('test_plot_map_scatter_2D_conus.png')
 
 
+def test_plot_map_scatter_thinned_global():
+    # Thin a large number of scattered points before plotting
+    rng = np.random.default_rng(11)
+    lats = rng.uniform(-90, 90, 500000)
+    lons = rng.uniform(-180, 180, 500000)
+    data = np.cos(np.radians(lats)) * np.sin(np.radians(2 * lons))
+
+    scatter = MapScatter(latitude=lats, longitude=lons, data=data)
+    scatter.markersize = 1
+    scatter.thin(resolution='auto', method='mean')
+
+    plot1 = CreatePlot()
+    plot1.plot_layers = [scatter]
+    plot1.projection = 'plcarr'
+    plot1.domain = 'global'
+    plot1.add_title(label='EMCPy Thinned Map')
+    plot1.add_colorbar(label='colorbar label')
+
+    fig = CreateFigure()
+    fig.plot_list = [plot1]
+    fig.create_figure()
+    fig.save_figure('test_plot_map_scatter_thinned_global.png')
+
+    npoints = len(fig.fig.axes[0].collections[0].get_offsets())
+    assert 0 < npoints < lats.size
+
+
+def test_projection_cache(tmp_path):
+    # Projected coordinates are computed once and reused across figures
+    lons, lats, z = _getContourData()
+    projection = MapProjection('npstere')
+
+    cache = ProjectionCache(maxsize=2, cache_dir=str(tmp_path))
+    px, py = cache.project(lons, lats, projection.transform, projection.projection)
+    ref = projection.projection.transform_points(projection.transform, lons, lats)
+    ref[~np.isfinite(ref)] = np.nan
+    assert np.allclose(px, ref[..., 0], equal_nan=True)
+    assert np.allclose(py, ref[..., 1], equal_nan=True)
+
+    # identical coordinates hit the cache, also from disk in a new cache
+    cache.project(lons.copy(), lats.copy(), projection.transform, projection.projection)
+    assert (cache.hits, cache.misses) == (1, 1)
+    disk = ProjectionCache(cache_dir=str(tmp_path))
+    dx, dy = disk.project(lons, lats, projection.transform, projection.projection)
+    assert disk.hits == 1 and np.array_equal(dx, px, equal_nan=True)
+
+    # pickled caches (e.g. with figures sent to workers) keep their configuration only
+    import pickle
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.cache_dir == cache.cache_dir and len(copy._cache) == 0 < len(cache._cache)
+
+    for i in range(2):
+        gridded = MapGridded(latitude=lats[40:], longitude=lons[40:], data=z[40:])
+        plot1 = CreatePlot()
+        plot1.plot_layers = [gridded]
+        plot1.projection = 'npstere'
+        plot1.domain = 'north'
+
+        fig = CreateFigure(projection_cache=cache)
+        fig.plot_list = [plot1]
+        fig.create_figure()
+        fig.save_figure('test_projection_cache.png')
+        fig.close_figure()
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_crop_to_domain():
+    # global 0-360 grid cropped to Europe, across the edge of the grid
+    lons, lats, z = _getContourData()
+    lat, lon, data = crop_grid(lats, lons, z, Domain('europe').extent)
+    assert data.shape[0] < z.shape[0] and data.shape[1] < z.shape[1]
+    assert np.all(np.diff(lon, axis=1) >= 0)
+    assert lon.min() < -12.5 and lon.max() > 40.
+    assert crop_grid(lats, lons, z, Domain('global').extent)[2] is z
+
+    keep = crop_points(lats, lons, Domain('conus').extent, halo=0.)
+    assert np.all((lats[keep] >= 20) & (lats[keep] <= 51))
+
+    # cropped and uncropped figures draw the same cells in the domain
+    meshes = []
+    for crop in [True, False]:
+        gridded = MapGridded(latitude=lats, longitude=lons, data=z)
+        plot1 = CreatePlot()
+        plot1.plot_layers = [gridded]
+        plot1.projection = 'plcarr'
+        plot1.domain = 'europe'
+
+        fig = CreateFigure(crop_to_domain=crop)
+        fig.plot_list = [plot1]
+        fig.create_figure()
+        fig.save_figure(f'test_crop_to_domain_{crop}.png')
+        meshes.append(fig.fig.axes[0].collections[0].get_array())
+        fig.close_figure()
+    assert meshes[0].size < meshes[1].size
+
+
+def test_crop_to_domain_masked():
+    # masked points (e.g. netCDF fill values) stay masked when cropped
+    rng = np.random.default_rng(8)
+    lats = rng.uniform(20., 50., 1000)
+    lons = rng.uniform(-125., -64., 1000)
+    data = np.ma.masked_greater(np.where(np.arange(1000) % 10 == 0, 9.96e36,
+                                         rng.uniform(0., 50., 1000)), 1e30)
+
+    vmax = []
+    for crop, cache in [(True, None), (False, None), (True, True)]:
+        plot1 = CreatePlot()
+        plot1.plot_layers = [MapScatter(latitude=lats, longitude=lons, data=data)]
+        plot1.projection = 'plcarr'
+        plot1.domain = 'conus'
+
+        fig = CreateFigure(crop_to_domain=crop, projection_cache=cache)
+        fig.plot_list = [plot1]
+        fig.create_figure()
+        vmax.append(fig.fig.axes[0].collections[0].norm.vmax)
+        fig.close_figure()
+    assert vmax[0] == vmax[1] == vmax[2] < 50.
+
+
+def test_crop_to_domain_cell_edges():
+    # coordinates of the cell edges, one longer than the data
+    lat_e = np.linspace(-90., 90., 37)
+    lon_e = np.linspace(-180., 180., 73)
+    z = np.arange(36 * 72, dtype=float).reshape(36, 72)
+
+    lat, lon, data = crop_grid(lat_e, lon_e, z, Domain('conus').extent)
+    assert data.shape == (lat.size - 1, lon.size - 1)
+    assert np.array_equal(data, z[np.searchsorted(lat_e, lat[0]):np.searchsorted(lat_e, lat[-1]),
+                                  np.searchsorted(lon_e, lon[0]):np.searchsorted(lon_e, lon[-1])])
+
+    # shapes that are neither centers nor edges are not cropped
+    odd = z[:, :-2]
+    assert crop_grid(lat_e, lon_e, odd, Domain('conus').extent)[2] is odd
+
+    gridded = MapGridded(latitude=lat_e, longitude=lon_e, data=z)
+    plot1 = CreatePlot()
+    plot1.plot_layers = [gridded]
+    plot1.projection = 'plcarr'
+    plot1.domain = 'conus'
+
+    fig = CreateFigure()
+    fig.plot_list = [plot1]
+    fig.create_figure()
+    fig.save_figure('test_crop_to_domain_cell_edges.png')
+    assert fig.fig.axes[0].collections[0].get_array().size == data.size
+    fig.close_figure()
+
+
+def test_plot_map_gridded_cubed_sphere():
+    # Six cubed-sphere tiles drawn as one raster image
+    lats, lons = _getCubedSphereGrid(48)
+    data = np.cos(np.radians(lats)) * np.sin(np.radians(2 * lons))
+
+    images = []
+    for renderer in ['raster', 'pcolormesh']:
+        gridded = MapGridded(latitude=lats, longitude=lons, data=data)
+        assert gridded.vmin is None and gridded.vmax is None
+        gridded.renderer = renderer
+
+        plot1 = CreatePlot()
+        plot1.plot_layers = [gridded]
+        plot1.projection = 'plcarr'
+        plot1.domain = 'global'
+        plot1.add_colorbar(label='colorbar label')
+
+        fig = CreateFigure()
+        fig.plot_list = [plot1]
+        fig.create_figure()
+        fig.save_figure(f'test_plot_map_gridded_cubed_sphere_{renderer}.png')
+        images.append(fig.fig.axes[0].get_children())
+        fig.close_figure()
+
+    # one image instead of one mesh per tile, the same tiles are remapped once
+    image = [child for child in images[0] if isinstance(child, plt.matplotlib.image.AxesImage)]
+    assert len(image) == 1
+    assert np.nanmax(np.abs(image[0].get_array())) <= 1.
+    assert not image[0].get_array().mask.any()
+
+    # the process-wide remapping cache is not pickled with figures
+    import pickle
+    assert len(pickle.dumps(CreateFigure())) < 10000
+
+
+def test_map_templates(tmp_path):
+    # Map features are drawn once per projection/domain and reused
+    import cartopy.crs as ccrs
+
+    drawn = []
+
+    def draw(ax, features):
+        drawn.append(list(features['features']))
+        ax.plot([-120, -70], [30, 45], color='black', transform=ccrs.PlateCarree())
+
+    cache = MapTemplateCache(cache_dir=str(tmp_path))
+    for i in range(2):
+        lats, lons = np.linspace(25, 50, 20), np.linspace(-120, -70, 20)
+        plot1 = CreatePlot()
+        plot1.plot_layers = [MapScatter(latitude=lats, longitude=lons, data=lats)]
+        plot1.projection = 'plcarr'
+        plot1.domain = 'conus'
+        plot1.add_map_features(['coastline', 'land'])
+
+        fig = CreateFigure(map_templates=cache)
+        fig._draw_map_features = draw
+        fig.plot_list = [plot1]
+        fig.create_figure()
+        fig.save_figure('test_map_templates.png')
+        images = fig.fig.axes[0].images
+        fig.close_figure()
+
+    # land goes below the data and the coastline above it
+    assert drawn == [['land'], ['coastline']]
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert sorted(image.get_zorder() for image in images) == [-1, 1.5]
+    assert images[0].get_array()[..., 3].any()
+
+    # images are read back from disk by a new cache
+    disk = MapTemplateCache(cache_dir=str(tmp_path))
+    fig = CreateFigure(map_templates=disk)
+    fig._draw_map_features = draw
+    fig.plot_list = [plot1]
+    fig.create_figure()
+    fig.close_figure()
+    assert disk.hits == 2 and len(drawn) == 2
+
+    # images are redrawn at the output dpi, and vector formats draw vectors
+    fig = CreateFigure(map_templates=disk)
+    fig._draw_map_features = draw
+    fig.plot_list = [plot1]
+    fig.create_figure()
+    shape = fig.fig.axes[0].images[0].get_array().shape
+    fig.save_figure(str(tmp_path / 'test_map_templates.png'), dpi=2 * fig.fig.dpi)
+    assert fig.fig.axes[0].images[0].get_array().shape[0] in range(2 * shape[0] - 1, 2 * shape[0] + 2)
+    assert len(drawn) == 4 and disk.misses == 2
+    fig.save_figure(str(tmp_path / 'test_map_templates.pdf'))
+    assert not fig.fig.axes[0].images and len(drawn) == 6
+    fig.close_figure()
+
+
+def test_feature_store(tmp_path):
+    # Map features read from local shapefiles, clipped to the domain
+    import shapefile
+    import cartopy.crs as ccrs
+
+    data_dir = tmp_path / 'natural_earth'
+    data_dir.mkdir()
+    for scale in ['110m', '50m']:
+        with shapefile.Writer(str(data_dir / f'ne_{scale}_coastline'),
+                              shapeType=shapefile.POLYLINE) as w:
+            w.field('name', 'C')
+            w.line([[[-150., 30.], [-100., 40.], [-60., 45.]]])
+            w.record('america')
+            w.line([[[0., 45.], [20., 50.]]])
+            w.record('europe')
+            w.line([[[170., 52.], [179., 53.]]])
+            w.record('aleutians')
+
+    store = FeatureStore(data_dir=str(data_dir), cache_dir=str(tmp_path / 'cache'))
+    projection = MapProjection('mill').projection
+    geoms = store.geometries('coastline', projection, Domain('conus').extent)
+    assert len(geoms) == 1
+    # clipped to the domain plus the halo, in projection coordinates
+    lon, lat = ccrs.PlateCarree().transform_points(projection, *np.array(geoms[0].coords).T)[:, :2].T
+    assert lon.max() < -57.
+    assert np.isclose(lon.min(), -125.5 - 6.2)
+
+    # processed geometries are read back from disk by a new store
+    disk = FeatureStore(data_dir=str(data_dir), cache_dir=str(tmp_path / 'cache'))
+    assert disk.geometries('coastline', projection, Domain('conus').extent)[0].equals(geoms[0])
+    assert (disk.hits, disk.misses) == (1, 0)
+
+    # the halo of North America crosses the dateline
+    geoms = store.geometries('coastline', projection, Domain('north america').extent)
+    lons = [ccrs.PlateCarree().transform_points(projection, *np.array(g.coords).T)[:, 0]
+            for g in geoms]
+    assert len(geoms) == 2 and np.allclose(lons[1], [178., 179.])
+
+    plot1 = CreatePlot()
+    plot1.projection = 'plcarr'
+    plot1.domain = 'europe'
+    plot1.add_map_features(['coastline'])
+
+    fig = CreateFigure(feature_store=store)
+    fig.plot_list = [plot1]
+    fig.create_figure()
+    fig.save_figure('test_feature_store.png')
+    fig.close_figure()
+    assert store.misses == 3
+    # the map of Europe is zoomed enough for the 50m scale
+    assert str(data_dir / 'ne_50m_coastline.shp') in FeatureStore._loaded
+
+    # batch workers prewarm the same shapefiles through the store
+    from emcpy.plots.batch import _init_worker
+
+    FeatureStore._loaded.clear()
+    _init_worker([('coastline', '50m')], str(data_dir))
+    assert list(FeatureStore._loaded) == [str(data_dir / 'ne_50m_coastline.shp')]
+
+
+def test_map_feature_scale():
+    # Natural Earth scale chosen from the size of a pixel in degrees
+    assert [feature_scale(r) for r in [0.5, 0.05, 0.005]] == ['110m', '50m', '10m']
+
+    plot1 = CreatePlot()
+    plot1.add_map_features(['coastline', 'states'], scale='10m', tolerance=0)
+    assert plot1.map_features == {'features': ['coastline', 'states'],
+                                  'scale': '10m', 'tolerance': 0}
+    with pytest.raises(ValueError):
+        plot1.add_map_features(scale='1m')
+
+
+def test_superob():
+    lats = np.array([10.1, 10.4, 10.2, 20.5, np.nan, -89.9])
+    lons = np.array([179.9, -179.6, 179.8, 340.5, 0., 5.])
+    data = np.array([1., 2., 3., 4., 5., np.nan])
+
+    lat, lon, values = superob(lats, lons, data, resolution=1., method='mean')
+    assert np.allclose(values, [2., 2., 4.])
+    assert np.allclose(lon, [-179.6, 179.85, -19.5])
+
+    lat, lon, values = superob(lats, lons, data, resolution=1., method='max')
+    assert np.allclose(values, [2., 3., 4.]) and np.allclose(lat, [10.4, 10.2, 20.5])
+
+    lat, lon, values = superob(lats, lons, data, resolution=1., method='first')
+    assert np.allclose(values, [2., 1., 4.])
+
+    # masked data (e.g. fill values read from netCDF) is dropped
+    masked = np.ma.masked_greater(np.array([1., 9.96e36, 3., 4., 5., 6.]), 1e30)
+    lat, lon, values = superob(lats, lons, masked, resolution=1., method='mean')
+    assert np.allclose(values, [6., 2., 4.]) and np.allclose(lon, [5., 179.85, -19.5])
+
+    scatter = MapScatter(latitude=lats, longitude=lons, data=data)
+    scatter.markersize = np.full(lats.size, 2.)
+    with pytest.raises(ValueError):
+        scatter.thin(1.)
+
+
 def test_plot_map_gridded_global():
     # Create 2d gridded plot on global domian
     lats = np.linspace(25, 50, 25)
@@ -193,3 +534,19 @@ def _getContourData(shape=(73, 145)):
     data = wave + mean
 
     return lons, lats, data
+
+
+def _getCubedSphereGrid(n):
+    # Generate cell centers of the six tiles of a gnomonic cubed sphere
+    a = np.linspace(-1, 1, n + 1)
+    a = 0.5 * (a[1:] + a[:-1])
+    a, b = np.meshgrid(a, a)
+    one = np.ones_like(a)
+    faces = [(one, a, b), (-a, one, b), (-one, -a, b),
+             (a, -one, b), (-b, a, one), (b, a, -one)]
+    xyz = np.stack([np.stack(face, axis=-1) for face in faces], axis=-2)
+
+    lons = np.degrees(np.arctan2(xyz[..., 1], xyz[..., 0]))
+    lats = np.degrees(np.arcsin(xyz[..., 2] / np.linalg.norm(xyz, axis=-1)))
+
+    return lats, lons
@@ -1,12 +1,16 @@
 import numpy as np
 from scipy.ndimage.filters import gaussian_filter
 import matplotlib.pyplot as plt
+import matplotlib.colors
 
 from emcpy.plots.plots import LinePlot, VerticalLine,\
     Histogram, Density, Scatter, HorizontalLine, BarPlot, \
     GriddedPlot, ContourPlot, FilledContourPlot, HorizontalBar, \
     BoxandWhiskerPlot, HorizontalSpan, SkewT
 from emcpy.plots.create_plots import CreatePlot, CreateFigure
+from emcpy.plots.batch import render_many
+from emcpy.plots.specs import figure_to_dict, figure_from_dict, to_yaml, from_yaml, \
+    spec_fingerprint, release
 
 
 def test_line_plot():
@@ -144,6 +148,36 @@ def test_histogram_plot():
     fig.save_figure('test_histogram_plot.png')
 
 
+def test_prebinned_histogram_plot():
+    # histogram drawn from counts matches binning the raw data
+
+    data1, data2 = _getHistData()
+    hst1 = Histogram(data1)
+    hst1.bins = 20
+    hst1.prebin()
+    assert hst1.data is None
+
+    counts, edges = np.histogram(data2, bins=20)
+    hst2 = Histogram.from_counts(edges, counts)
+    hst2.histtype = 'step'
+    hst2.color = 'tab:red'
+    hst2.linewidth = 2.5
+
+    plot1 = CreatePlot()
+    plot1.plot_layers = [hst1, hst2]
+    plot1.add_title(label='Test Pre-binned Histogram Plot')
+    plot1.add_legend()
+
+    fig = CreateFigure()
+    fig.plot_list = [plot1]
+    fig.create_figure()
+    fig.save_figure('test_prebinned_histogram_plot.png')
+
+    heights = [patch.get_height() for patch in fig.fig.axes[0].patches[:20]]
+    assert np.array_equal(heights, np.histogram(data1, bins=20)[0])
+    assert fig.fig.axes[0].patches[-1].get_linewidth() == 2.5
+
+
 # def test_histogram_plot_2_x_axes():
 #     # create histogram plot on two pair of axes with
 #     # a shared y axis
@@ -204,6 +238,78 @@ def test_scatter_plot():
     fig.save_figure('test_scatter_plot.png')
 
 
+def test_density_scatter_image_plot():
+    # density scatter drawn as a rasterized 2d histogram
+
+    rng = np.random.default_rng(3)
+    x = rng.normal(size=200000)
+    y = 0.6 * x + rng.normal(scale=0.5, size=x.size)
+    x[::50] = np.nan
+
+    sctr1 = Scatter(x, y)
+    sctr1.density_scatter()
+    sctr1.density['mode'] = 'image'
+    sctr1.density['norm'] = 'log'
+
+    plot1 = CreatePlot()
+    plot1.plot_layers = [sctr1]
+    plot1.add_title(label='Test Density Scatter Image Plot')
+    plot1.add_colorbar(label='% of samples')
+
+    fig = CreateFigure()
+    fig.plot_list = [plot1]
+    fig.create_figure()
+    fig.save_figure('test_density_scatter_image_plot.png')
+    # norm names are mapped to Normalize objects for older matplotlib
+    assert isinstance(fig.fig.axes[0].collections[0].norm, matplotlib.colors.LogNorm)
+
+    _idx = ~np.isnan(x)
+    counts, _, _, _ = fig._histogram2d_index(x[_idx], y[_idx], [100, 100])
+    assert np.array_equal(counts, np.histogram2d(x[_idx], y[_idx], bins=[100, 100])[0])
+
+    # percentages are of all valid points, also those outside the edges
+    edges = np.linspace(-1., 1., 21)
+    sctr1.density['bins'] = [edges, edges]
+    fig = CreateFigure()
+    fig.plot_list = [plot1]
+    fig.create_figure()
+    counts = np.histogram2d(x[_idx], y[_idx], bins=[edges, edges])[0]
+    mesh = fig.fig.axes[0].collections[0].get_array()
+    assert np.allclose(mesh.filled(0.), (counts / np.count_nonzero(_idx) * 100.).T.ravel())
+
+
+def test_density_scatter_nearest_plot():
+    # density scatter colored by each point's own bin, capped markers
+
+    rng = np.random.default_rng(5)
+    x = rng.normal(size=100000)
+    y = 0.6 * x + rng.normal(scale=0.5, size=x.size)
+
+    sctr1 = Scatter(x, y)
+    sctr1.density_scatter()
+    sctr1.density['interp'] = 'nearest'
+    sctr1.density['max_points'] = 10000
+
+    plot1 = CreatePlot()
+    plot1.plot_layers = [sctr1]
+    plot1.add_title(label='Test Density Scatter Nearest Plot')
+    plot1.add_colorbar(label='% of samples')
+
+    fig = CreateFigure()
+    fig.plot_list = [plot1]
+    fig.create_figure()
+    fig.save_figure('test_density_scatter_nearest_plot.png')
+
+    offsets = fig.fig.axes[0].collections[0].get_offsets()
+    assert 9000 < len(offsets) < 11000
+
+    # explicit edges leave points outside the edges uncounted
+    edges = np.linspace(-1., 1., 11)
+    counts, _, _, flat = fig._histogram2d_index(x, y, edges)
+    assert np.array_equal(counts, np.histogram2d(x, y, bins=edges)[0])
+    assert np.array_equal(np.bincount(flat[flat >= 0], minlength=100), counts.ravel())
+
+
 # def test_scatter_plot_2_y_axes():
 #     # create scatter plot using two sets of axes
 #     # with a shared x axis
@@ -359,6 +465,82 @@ def test_add_logo():
     fig.save_figure('test_add_logo.png')
 
 
+def test_render_many(tmp_path):
+    # render a batch of figures in worker processes
+
+    def figures():
+        for i in range(4):
+            x1, y1, x2, y2, x3, y3 = _getLineData()
+            lp1 = LinePlot(x1, np.asarray(y1) * (i + 1))
+            if i == 2:
+                # not a valid matplotlib option, fails on this figure only
+                lp1.not_an_option = True
+            if i == 1:
+                # can not be sent to a worker process
+                lp1.not_picklable = lambda: None
+
+            plot1 = CreatePlot()
+            plot1.plot_layers = [lp1]
+            plot1.add_title(label=f'Test Batch Plot {i}')
+
+            fig = CreateFigure()
+            fig.plot_list = [plot1]
+            yield fig, str(tmp_path / f'test_render_many_{i}.png')
+
+    results = sorted(render_many(figures(), workers=2, prewarm=None, max_pending=2))
+    assert [result.index for result in results] == [0, 1, 2, 3]
+    assert [result.error is None for result in results] == [True, False, False, True]
+    assert results[1].path == str(tmp_path / 'test_render_many_1.png')
+    assert 'not_an_option' in results[2].error
+    assert all((tmp_path / f'test_render_many_{i}.png').exists() for i in [0, 3])
+
+    # serial rendering in this process gives the same outcome
+    results = sorted(render_many(figures(), workers=1))
+    assert [result.error is None for result in results] == [True, False, False, True]
+
+
+def test_figure_spec(tmp_path):
+    # figures described by specs that reference arrays by handle
+
+    x1, y1, x2, y2 = _getScatterData()
+    sctr1 = Scatter(np.tile(x1, 50), np.tile(y1, 50))
+    sctr1.density_scatter()
+    hst1 = Histogram(np.asarray(y2))
+
+    plot1 = CreatePlot()
+    plot1.plot_layers = [sctr1]
+    plot1.add_title(label='Test Spec Plot')
+    plot1.invert_yaxis()
+    plot2 = CreatePlot()
+    plot2.plot_layers = [hst1]
+
+    fig = CreateFigure(nrows=1, ncols=2, figsize=(10, 4))
+    fig.plot_list = [plot1, plot2]
+
+    spec = figure_to_dict(fig, array_dir=str(tmp_path / 'arrays'))
+    text = to_yaml(spec)
+    assert 'npy' in text and len(text) < 10000
+    assert spec_fingerprint(spec) == spec_fingerprint(figure_to_dict(fig, array_dir=str(tmp_path / 'arrays')))
+
+    fig2 = from_yaml(text)
+    assert callable(fig2.plot_list[0].invert_yaxis)
+    assert np.array_equal(fig2.plot_list[0].plot_layers[0].x, sctr1.x)
+    assert fig2.plot_list[0].plot_layers[0].density == sctr1.density
+    fig2.create_figure()
+    fig2.save_figure(str(tmp_path / 'test_figure_spec.png'))
+    assert fig2.fig.axes[0].yaxis_inverted()
+
+    # arrays in shared memory, rendered by worker processes
+    spec = figure_to_dict(fig, arrays='shm')
+    try:
+        results = list(render_many([(spec, str(tmp_path / 'test_figure_spec_shm.png'))],
+                                   workers=2, prewarm=None))
+    finally:
+        release(spec)
+    assert results[0].error is None
+    assert (tmp_path / 'test_figure_spec_shm.png').exists()
+
+
 def test_multi_subplot():
     # Create a figure with four different subplots
 
@@ -1,5 +1,9 @@
 from emcpy.stats.stats import mstats, lregress, ttest, get_weights,\
-    get_linear_regression, bootstrap, calc_bins
+    get_linear_regression, bootstrap, calc_bins, ttest_from_summaries, \
+    get_weighted_mean, IncrementalTTest, t_critical
+from emcpy.stats.accumulators import MStatsAccumulator, SummaryStats, HistogramAccumulator, \
+    bin_index
+from emcpy.stats.regional import WeightedMean, RegionalIndex, domain_mask
 import numpy as np
 
 
@@ -8,6 +12,37 @@ def test_mstats():
     mstats(sample_data, verbose=True)
 
 
+def test_mstats_accumulator():
+    rng = np.random.default_rng(3)
+    data = rng.normal(loc=2., size=(4, 50, 60))
+    data[0, :3, :] = np.nan
+    data[1, 5, :10] = 0.
+
+    acc = MStatsAccumulator(approx_median=True)
+    for level in data:
+        acc.update(level)
+    result = acc.result()
+    expected = mstats(data, verbose=False)
+
+    assert result.MatrixSize == expected.MatrixSize
+    for field in ['NElements', 'Nnans', 'NAnalyzedElements', 'Mean', 'Max', 'Min',
+                  'StDev', 'MeanAbs', 'MinAbs', 'FracZero', 'FracNan']:
+        assert np.isclose(getattr(result, field), getattr(expected, field)), field
+    assert abs(result.Median - expected.Median) < 0.01
+
+    # integer data as read from e.g. QC flags or counts
+    counts = rng.integers(-5, 6, size=(3, 40))
+    acc = MStatsAccumulator()
+    for row in counts:
+        acc.update(row)
+    result = acc.result()
+    expected = mstats(counts.astype(np.float64), verbose=False)
+    assert isinstance(result.NAnalyzedElements, int)
+    for field in ['NAnalyzedElements', 'Mean', 'Max', 'Min', 'StDev', 'MeanAbs',
+                  'MinAbs', 'FracZero']:
+        assert np.isclose(getattr(result, field), getattr(expected, field)), field
+
+
 def test_lregress():
     x = np.array([1, 2, 2, 4, 5, 6, 6, 8, 9, 10], dtype=np.float32())
     y = np.array([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], dtype=np.float32())
@@ -15,6 +50,31 @@ def test_lregress():
     print(f' rc, sb, ssig = {rc, sb, ssig}')
 
 
+def test_lregress_batched():
+    rng = np.random.default_rng(7)
+    x = np.arange(30, dtype=np.float64)
+    y = 0.05 * x[:, None, None] * rng.normal(size=(1, 4, 5)) + rng.normal(size=(30, 4, 5))
+    y[3, 0, 0] = np.nan
+
+    rc, sb, ssig = lregress(x, y)
+    assert rc.shape == sb.shape == ssig.shape == (4, 5)
+    for j in range(4):
+        for i in range(5):
+            valid = ~np.isnan(y[:, j, i])
+            expected = lregress(x[valid], y[valid, j, i])
+            assert np.allclose((rc[j, i], sb[j, i]), expected[:2])
+            assert ssig[j, i] == expected[2]
+
+
+def test_t_critical():
+    t_critical.cache_clear()
+    assert np.isclose(t_critical(95.0, 18), 2.10092204)
+    tcrit = t_critical(95.0, np.array([[18, 30], [18, 30]]))
+    assert tcrit.shape == (2, 2)
+    info = t_critical.cache_info()
+    assert info.misses == 2 and info.hits == 1
+
+
 def test_ttest():
     x = np.array([70, 65, 80, 90, 92, 88, 67, 72, 10, 95], dtype=np.float32())
     y = np.array([35, 75, 67, 81, 94, 71, 67, 74, 35, 85], dtype=np.float32())
@@ -22,12 +82,108 @@ def test_ttest():
     print(f' diffmean, errorbar = {diffmean, errorbar}')
 
 
+def test_ttest_chunked(tmp_path):
+    rng = np.random.default_rng(5)
+    x = rng.normal(size=(20, 6, 8)).astype(np.float32)
+    y = x + rng.normal(scale=0.3, size=(20, 6, 8)).astype(np.float32)
+    x[2, 1, 1] = np.nan
+    y[7, 3, 2] = np.nan
+
+    nsamp = x.shape[0]
+    tcrit = 2.0243941639119702  # t.ppf(0.975, 38)
+    for paired in [True, False]:
+        if paired:
+            std_err = np.sqrt(np.nanvar(y-x, axis=0, ddof=1) / nsamp)
+        else:
+            std_err = np.sqrt((np.nanvar(x, axis=0, ddof=1) +
+                               np.nanvar(y, axis=0, ddof=1)) / (nsamp-1.))
+        expected = (np.nanmean(y, axis=0) - np.nanmean(x, axis=0), tcrit * std_err)
+
+        in_memory = ttest(x, y, paired=paired)
+        slabs = ttest(x, y, paired=paired, chunk_size=3)
+        stream = ttest((x[i:i+4] for i in range(0, 20, 4)),
+                       (y[i:i+4] for i in range(0, 20, 4)), paired=paired)
+        for result in [in_memory, slabs, stream]:
+            assert np.allclose(result, expected, rtol=1e-5, atol=1e-6)
+
+    # adding one cycle at a time, with a save/restore halfway
+    for paired in [True, False]:
+        incremental = IncrementalTTest(paired=paired)
+        for i in range(10):
+            incremental.update(x[i], y[i])
+        incremental.save(tmp_path / 'ttest_state.npz')
+        incremental = IncrementalTTest.load(tmp_path / 'ttest_state.npz')
+        incremental.extend(x[10:], y[10:])
+        assert incremental.ncycles == nsamp
+        assert np.allclose(incremental.result(), ttest(x, y, paired=paired), equal_nan=True)
+
+    # y defaults to x, giving no difference
+    diffmean, errorbar = ttest(x, chunk_size=7)
+    assert np.all(diffmean[~np.isnan(diffmean)] == 0.)
+
+
 def test_get_weights():
     lats = np.array([90, -90, 0, 18, -25, -10.3, 45.5], dtype=np.float32())
     result = get_weights(lats)
     print(f' weighted means: {result}')
 
 
+def test_weighted_mean():
+    lats = np.linspace(-89.5, 89.5, 180)
+    lons = np.arange(0., 360., 1.)
+    data = np.random.default_rng(8).normal(size=(3, 180, 360))
+    data[1, 10:20, :] = np.nan
+
+    wm = WeightedMean(lats, lons)
+    wm.add_region('conus')
+    wm.add_region('europe')
+
+    weights = np.broadcast_to(get_weights(lats)[:, None], (180, 360))
+    expected = np.ma.average(np.ma.masked_invalid(data), weights=np.broadcast_to(weights, data.shape),
+                             axis=(1, 2))
+    assert np.allclose(wm.mean(data), expected)
+    assert np.allclose(wm.mean(np.ma.masked_invalid(data)), expected)
+
+    # europe crosses the prime meridian on a 0-360 grid
+    mask = domain_mask(lats[:, None], lons[None, :], 'europe')
+    assert mask[:, lons > 340].any() and mask[:, lons < 40].any()
+    expected = np.average(data[0][mask], weights=weights[mask])
+    assert np.isclose(wm.mean(data[0], region='europe'), expected)
+
+    means = wm.means({'t': data, 'q': 2. * data})
+    assert set(means['t']) == {None, 'conus', 'europe'}
+    assert np.allclose(means['q']['europe'], 2. * means['t']['europe'])
+    assert np.isclose(means['t']['europe'][0], expected)
+
+
+def test_regional_index():
+    rng = np.random.default_rng(9)
+    # cubed-sphere like layout: arbitrary lat/lon per point over 6 tiles
+    lats = rng.uniform(-90., 90., size=(12, 12, 6))
+    lons = rng.uniform(0., 360., size=(12, 12, 6))
+    field = rng.normal(size=(2, 12, 12, 6))
+    truth = rng.normal(size=(2, 12, 12, 6))
+    field[0, 0, 0, 0] = np.nan
+
+    index = RegionalIndex(lats, lons, weighted=False)
+    assert 'conus' in index.regions and 'custom' not in index.regions
+
+    stats = index.compute_many({'t': field}, references={'t': truth})['t']
+    for region in ['global', 'north america', 'europe']:
+        mask = domain_mask(lats, lons, region)
+        diff = field[:, mask] - truth[:, mask]
+        assert np.allclose(stats[region]['mean'], np.nanmean(field[:, mask], axis=-1))
+        assert np.allclose(stats[region]['bias'], np.nanmean(diff, axis=-1))
+        assert np.allclose(stats[region]['rmse'], np.sqrt(np.nanmean(diff**2, axis=-1)))
+
+    # masked values (e.g. netCDF fill values) are left out like NaNs
+    masked = np.ma.masked_greater(np.where(np.isnan(field), 1e20, field), 1e19)
+    masked_stats = index.compute(masked, reference=np.ma.asarray(truth))
+    for region in ['global', 'north america', 'europe']:
+        for name in ['count', 'mean', 'bias', 'rmse']:
+            assert np.allclose(masked_stats[region][name], stats[region][name])
+
+
 def test_get_linear_regression():
     x = np.array([70, 65, 80, 90, 92, 88, 67, 72, 10, 95], dtype=np.float32())
     y = np.array([35, 75, 67, 81, 94, 71, 67, 74, 35, 85], dtype=np.float32())
@@ -36,6 +192,33 @@ def test_get_linear_regression():
     print(f'y_pred, r_sq, intercept, slope = {y_pred, r_sq, intercept, slope}')
 
 
+def test_get_linear_regression_batched():
+    rng = np.random.default_rng(6)
+    x = rng.normal(loc=250., size=(200, 3))
+    y = 0.5 * x + rng.normal(size=(200, 3))
+    x[4, 1] = np.nan
+
+    y_pred, r_sq, intercept, slope = get_linear_regression(x, y)
+    assert slope.shape == (3,)
+    for ch in range(3):
+        valid = ~np.isnan(x[:, ch])
+        fit = np.polyfit(x[valid, ch], y[valid, ch], 1)
+        assert np.allclose([slope[ch], intercept[ch]], fit)
+        assert np.isclose(r_sq[ch], np.corrcoef(x[valid, ch], y[valid, ch])[0, 1]**2)
+    assert np.isnan(y_pred[4, 1])
+
+    # a shared 1-D x is regressed against every column of y
+    y_pred, r_sq, intercept, slope = get_linear_regression(x[:, 0], y)
+    assert slope.shape == (3,)
+    for ch in range(3):
+        assert np.allclose([slope[ch], intercept[ch]], np.polyfit(x[:, 0], y[:, ch], 1))
+
+    # constant x is fitted by the mean of y
+    y_pred, r_sq, intercept, slope = get_linear_regression(np.full(5, 3.), np.arange(5.))
+    assert (slope, intercept, r_sq) == (0., 2., 0.)
+    assert np.allclose(y_pred, 2.)
+
+
 def test_bootstrap():
     sample_data = np.array([30, 37, 36, 43, 42, 43, 43, 46, 41, 42], dtype=np.float32())
     ci_lower, ci_upper = bootstrap(sample_data, nrepl=10000)
@@ -44,6 +227,19 @@ def test_bootstrap():
     print(f'ci_lower,ci_upper = {xbar+ci_lower, xbar+ci_upper}')
 
 
+def test_bootstrap_seed_and_blocks():
+    sample_data = np.random.default_rng(1).normal(size=500)
+    # same seed and block layout reproduces the interval
+    ci1 = bootstrap(sample_data, nrepl=2000, seed=42, block_size=5000)
+    ci2 = bootstrap(sample_data, nrepl=2000, seed=42, block_size=5000)
+    assert ci1 == ci2
+    assert ci1[0] < 0. < ci1[1]
+
+    # callable estimators are reduced along the replicate axis
+    ci_lower, ci_upper = bootstrap(sample_data, estimator=np.std, nrepl=500, seed=0)
+    assert ci_lower < ci_upper
+
+
 def test_calc_bins():
     sample_data = np.array([0.5, -0.4, -0.7, 0.9, -0.01, 0.02, -0.6, 0.3, -0.9, 0.82, -0.03, 0.41],
                            dtype=np.float32())
@@ -51,3 +247,88 @@ def test_calc_bins():
     bins, binsize = calc_bins(sample_data, eval_type)
 
     print(f'bins, binsize = {bins, binsize}')
+
+
+def test_histogram_accumulator():
+    rng = np.random.default_rng(4)
+    data = rng.normal(scale=2., size=20000)
+    data[::97] = np.nan
+    chunks = np.array_split(data, 7)
+
+    # bins derived from moments match calc_bins on the whole array
+    hist = HistogramAccumulator.from_chunks(chunks, eval_type='observation')
+    bins, _ = calc_bins(data[~np.isnan(data)], 'observation')
+    assert np.allclose(hist.edges, bins)
+
+    counts, _ = np.histogram(data[~np.isnan(data)], bins=hist.edges)
+    assert np.array_equal(hist.counts, counts)
+    assert hist.total == np.count_nonzero(~np.isnan(data))
+    assert hist.nnan == np.count_nonzero(np.isnan(data))
+
+    # fixed range, merged across workers and non-uniform edges
+    parts = [HistogramAccumulator(bins=40, range=(-3., 3.)) for _ in chunks]
+    for part, chunk in zip(parts, chunks):
+        part.update(chunk)
+    merged = parts[0]
+    for part in parts[1:]:
+        merged = merged.merge(part)
+    counts, _ = np.histogram(data[~np.isnan(data)], bins=40, range=(-3., 3.))
+    assert np.array_equal(merged.counts, counts)
+
+    edges = [-5., -1., 0., 0.5, 4.]
+    hist = HistogramAccumulator(bins=edges)
+    hist.update(data)
+    counts, _ = np.histogram(data[~np.isnan(data)], bins=edges)
+    assert np.array_equal(hist.counts, counts)
+
+    hist = HistogramAccumulator.from_dict(hist.to_dict())
+    assert np.array_equal(hist.counts, counts)
+
+    # uniform and searched bin indices agree, with the last edge included
+    x = np.concatenate([data[~np.isnan(data)], [-3., 3., -7., 7.]])
+    edges = np.linspace(-3., 3., 41)
+    fast, searched = bin_index(x, edges), bin_index(x, edges, uniform=False)
+    assert np.array_equal(fast, searched)
+    assert list(fast[-4:]) == [0, 39, -1, 40]
+
+
+def test_bootstrap_parallel():
+    sample_data = np.random.default_rng(2).normal(size=1000)
+    serial = bootstrap(sample_data, estimator='median', nrepl=400, seed=7)
+    parallel = bootstrap(sample_data, estimator='median', nrepl=400, seed=7, n_jobs=2)
+    assert serial == parallel
+
+
+def test_summary_stats_merge():
+    rng = np.random.default_rng(4)
+    x = rng.normal(size=(12, 30))
+    y = x + rng.normal(scale=0.5, size=(12, 30))
+    x[3, 4] = np.nan
+
+    # summaries of two sets of cycles, merged after a round trip through a dict
+    parts = [(x[:5], y[:5]), (x[5:], y[5:])]
+    xs, ys, ds = SummaryStats(), SummaryStats(), SummaryStats()
+    for xp, yp in parts:
+        xs = xs.merge(SummaryStats.from_dict(SummaryStats.from_array(xp, axis=0).to_dict()))
+        ys = ys.merge(SummaryStats.from_array(yp, axis=0))
+        ds = ds.merge(SummaryStats.from_array(yp - xp, axis=0))
+
+    assert np.allclose(xs.mean, np.nanmean(x, axis=0))
+    assert np.allclose(xs.var(), np.nanvar(x, axis=0, ddof=1))
+    for paired in [True, False]:
+        expected = ttest(x, y, paired=paired)
+        result = ttest_from_summaries(xs, ys, ds, paired=paired)
+        assert np.allclose(expected, result, equal_nan=True)
+
+    # weighted means combine exactly across tiles
+    weights = get_weights(np.linspace(-80, 80, 30))[None, :] * np.ones((12, 30))
+    tiles = SummaryStats.from_array(y[:, :10], weights=weights[:, :10]).merge(
+        SummaryStats.from_array(y[:, 10:], weights=weights[:, 10:]))
+    assert np.isclose(tiles.mean, get_weighted_mean(y, weights))
+
+    # mstats accumulators combine across ranks
+    rank0, rank1 = MStatsAccumulator(), MStatsAccumulator()
+    rank0.update(y[:6])
+    rank1.update(y[6:])
+    merged = MStatsAccumulator.from_dict(rank0.merge(rank1).to_dict()).result()
+    assert np.isclose(merged.StDev, mstats(y, verbose=False).StDev)